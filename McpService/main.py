@@ -1,5 +1,6 @@
 import os
 import sys
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 import uvicorn
@@ -14,6 +15,7 @@ sys.path.insert(0, str(Path(__file__).parent))
 from shared.auth import routes as auth_routes
 from shared.middleware import SetUserIdFromHeaderMiddleware
 from tools.file_storage import (
+    close_rag_client,
     create_note,
     delete_file,
     list_files,
@@ -21,6 +23,7 @@ from tools.file_storage import (
     read_file,
     search_files,
     upload_file,
+    wait_for_git_commits,
 )
 from tools.obsidian_sync import (
     configure_obsidian_sync,
@@ -83,6 +86,20 @@ else:
     combined_routes.extend(health_routes)
     base_app = Starlette(routes=combined_routes, lifespan=mcp_lifespan)
 
+# Finish pending Git commits and close the shared RAG API client when the app shuts down
+_base_lifespan = base_app.router.lifespan_context
+
+
+@asynccontextmanager
+async def lifespan(app_instance):
+    async with _base_lifespan(app_instance) as state:
+        yield state
+    await wait_for_git_commits()
+    await close_rag_client()
+
+
+base_app.router.lifespan_context = lifespan
+
 # Add middleware
 app = SetUserIdFromHeaderMiddleware(base_app)
 
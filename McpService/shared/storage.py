@@ -92,19 +92,25 @@ class TokenStore:
 # Singleton instance
 token_store = TokenStore()
 
+def _ensure_dir(path: Path) -> Path:
+    """Create a directory unless it already exists.
+
+    A single stat is cheaper than mkdir(exist_ok=True), which fails with EEXIST and
+    re-stats on every call. Not memoized, since directories can be removed at runtime.
+    """
+    if not path.is_dir():
+        path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
 def get_user_storage_path(user_id: str) -> Path:
     """Get the storage directory path for a user"""
-    user_dir = STORAGE_ROOT / user_id
-    user_dir.mkdir(parents=True, exist_ok=True)
-    return user_dir
+    return _ensure_dir(STORAGE_ROOT / user_id)
 
 
 def get_user_vault_path(user_id: str) -> Path:
     """Get the Obsidian vault directory path for a user"""
-    user_dir = get_user_storage_path(user_id)
-    vault_dir = user_dir / "obsidian_vault"
-    vault_dir.mkdir(parents=True, exist_ok=True)
-    return vault_dir
+    return _ensure_dir(STORAGE_ROOT / user_id / "obsidian_vault")
 
 
 def set_obsidian_headers(repo_url: Optional[str], token: Optional[str], branch: Optional[str]):
@@ -0,0 +1,47 @@
+"""
+Shared pytest fixtures for McpService tests.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add McpService directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from tools import file_storage
+
+
+@pytest.fixture(autouse=True)
+def reset_rag_client():
+    """Ensure each test builds its own RAG API client instead of reusing a stale one"""
+    file_storage._rag_client = None
+    file_storage._local_embed_retry_at = 0.0
+    yield
+    file_storage._rag_client = None
+    file_storage._local_embed_retry_at = 0.0
+
+
+@pytest.fixture(autouse=True)
+def reset_git_queues(monkeypatch):
+    """Commit queued Git changes without a batching delay and start each test with no workers or cached config"""
+    monkeypatch.setattr(file_storage, "GIT_BATCH_WINDOW_SECONDS", 0)
+    file_storage._git_queues.clear()
+    file_storage._git_config_cache.clear()
+    file_storage._git_remotes_ready.clear()
+    yield
+    file_storage._git_queues.clear()
+    file_storage._git_config_cache.clear()
+    file_storage._git_remotes_ready.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_search_cache():
+    """Start each test with an empty semantic search cache"""
+    file_storage._search_cache.clear()
+    file_storage._search_cache_fingerprints.clear()
+    file_storage._search_cache_generations.clear()
+    yield
+    file_storage._search_cache.clear()
+    file_storage._search_cache_fingerprints.clear()
+    file_storage._search_cache_generations.clear()
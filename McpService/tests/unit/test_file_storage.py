@@ -44,7 +44,7 @@ def mock_rag_api():
     """Mock the RAG API HTTP client"""
     with patch('tools.file_storage.httpx.AsyncClient') as mock_client:
         mock_instance = AsyncMock()
-        mock_client.return_value.__aenter__.return_value = mock_instance
+        mock_client.return_value = mock_instance
 
         # Mock successful responses
         mock_response = MagicMock()
@@ -78,7 +78,7 @@ def mock_git():
     """Mock Git operations"""
     with patch('tools.file_storage.Repo') as mock_repo_class:
         mock_repo = MagicMock()
-        mock_repo.is_dirty.return_value = True
+        mock_repo.git.diff.return_value = "test.txt"
         mock_repo.git.add = MagicMock()
         mock_repo.index.commit = MagicMock()
         mock_repo.remotes = MagicMock()
@@ -318,6 +318,28 @@ class TestFileOperations:
 
         assert result == "Test content"
 
+    @pytest.mark.asyncio
+    async def test_large_file_round_trip(self, temp_storage_dir, setup_user, mock_rag_api):
+        """Test that multi-block files are written and read back intact"""
+        content = "line of text\n" * 10000
+        await file_storage.upload_file("large.md", content)
+
+        assert await file_storage.read_file("large.md") == content
+
+    @pytest.mark.asyncio
+    async def test_upload_reports_and_indexes_utf8_byte_size(self, temp_storage_dir, setup_user, mock_rag_api):
+        """Test that the reported and indexed size is the UTF-8 byte length, not the character count"""
+        content = "Grüße ✓"
+        size = len(content.encode('utf-8'))
+
+        result = await file_storage.upload_file("unicode.md", content)
+
+        assert f"({size} bytes)" in result
+        metadata = json.loads(mock_rag_api.post.call_args[1]['data']['storage_metadata'])
+        assert metadata["size"] == size
+        file_path = temp_storage_dir / "test_user_123" / "obsidian_vault" / "unicode.md"
+        assert file_path.stat().st_size == size
+
     @pytest.mark.asyncio
     async def test_read_nonexistent_file(self, temp_storage_dir, setup_user):
         """Test reading a file that doesn't exist"""
@@ -343,6 +365,20 @@ class TestFileOperations:
         assert delete_call_count >= 1  # Delete old embeddings
         assert post_call_count >= 2     # Original upload + re-index
 
+    @pytest.mark.asyncio
+    async def test_modify_file_unchanged_content_skips_reindex(self, temp_storage_dir, setup_user, mock_rag_api):
+        """Test that writing identical content does not re-index or commit the file"""
+        await file_storage.upload_file("test.txt", "Same content")
+        mock_rag_api.post.reset_mock()
+
+        with patch('tools.file_storage._schedule_git_commit') as mock_schedule:
+            result = await file_storage.modify_file("test.txt", "Same content")
+
+        assert "No changes to 'test.txt'" in result
+        mock_rag_api.delete.assert_not_called()
+        mock_rag_api.post.assert_not_called()
+        mock_schedule.assert_not_called()
+
     @pytest.mark.asyncio
     async def test_modify_nonexistent_file(self, temp_storage_dir, setup_user, mock_rag_api):
         """Test modifying a file that doesn't exist"""
@@ -512,7 +548,7 @@ class TestRAGIntegration:
         with patch('tools.file_storage.httpx.AsyncClient') as mock_client, \
              patch('tools.file_storage._generate_jwt_token', return_value="test_jwt_token"):
             mock_instance = AsyncMock()
-            mock_client.return_value.__aenter__.return_value = mock_instance
+            mock_client.return_value = mock_instance
 
             mock_response = MagicMock()
             mock_response.status_code = 200  # Set status_code as int
@@ -567,6 +603,98 @@ class TestGitIntegration:
                 # The function is non-blocking, so we just verify it was called
                 pass
 
+    @pytest.mark.asyncio
+    async def test_git_commit_skipped_when_nothing_staged(self, temp_storage_dir, setup_user, mock_rag_api, mock_git):
+        """Test that no commit or push happens when git add staged no changes"""
+        user_dir = temp_storage_dir / "test_user_123"
+        user_dir.mkdir(parents=True, exist_ok=True)
+        (user_dir / "git_config.json").write_text(json.dumps({"repo_url": "https://github.com/user/vault.git"}))
+        mock_git.git.diff.return_value = ""
+
+        with patch('tools.file_storage.get_token_from_store', return_value=None):
+            await file_storage.upload_file("test.txt", "Test content")
+            await file_storage.wait_for_git_commits()
+
+        mock_git.git.diff.assert_called_once_with('--cached', '--name-only')
+        mock_git.index.commit.assert_not_called()
+        mock_git.remotes.origin.push.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_git_config_cached_until_invalidated(self, temp_storage_dir, setup_user):
+        """Test that git_config.json is read once and re-read after invalidate_git_config"""
+        assert await file_storage._load_git_config("test_user_123") is None
+
+        config_path = temp_storage_dir / "test_user_123" / "git_config.json"
+        config_path.write_text(json.dumps({"repo_url": "https://github.com/user/vault.git"}))
+        assert await file_storage._load_git_config("test_user_123") is None
+
+        file_storage.invalidate_git_config("test_user_123")
+        config = await file_storage._load_git_config("test_user_123")
+        assert config["repo_url"] == "https://github.com/user/vault.git"
+
+    @pytest.mark.asyncio
+    async def test_git_remote_setup_runs_once_per_process(self, temp_storage_dir, setup_user, mock_rag_api, mock_git):
+        """Test that the remote URL and credential store are only configured before the first push"""
+        user_dir = temp_storage_dir / "test_user_123"
+        user_dir.mkdir(parents=True, exist_ok=True)
+        (user_dir / "git_config.json").write_text(json.dumps({"repo_url": "https://github.com/user/vault.git"}))
+
+        with patch('tools.file_storage.setup_credential_store') as mock_setup, \
+             patch('tools.file_storage.get_token_from_store', return_value="token") as mock_token:
+            await file_storage.upload_file("first.md", "First")
+            await file_storage.wait_for_git_commits()
+            await file_storage.upload_file("second.md", "Second")
+            await file_storage.wait_for_git_commits()
+
+        assert mock_git.remotes.origin.push.call_count == 2
+        mock_setup.assert_called_once()
+        mock_token.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_git_commit_runs_in_background(self, temp_storage_dir, setup_user, mock_rag_api):
+        """Test that file operations return before the Git commit finishes"""
+        import asyncio
+
+        release = asyncio.Event()
+
+        async def slow_commit(*args, **kwargs):
+            await release.wait()
+
+        with patch('tools.file_storage._trigger_git_commit', side_effect=slow_commit) as mock_commit:
+            result = await file_storage.upload_file("test.txt", "Test content")
+            assert "Successfully uploaded" in result
+            assert len(file_storage._git_tasks) == 1
+
+            release.set()
+            await file_storage.wait_for_git_commits()
+
+            mock_commit.assert_awaited_once()
+            assert not file_storage._git_tasks
+
+    @pytest.mark.asyncio
+    async def test_git_commits_are_batched_per_user(self, temp_storage_dir, setup_user, mock_rag_api, mock_git, monkeypatch):
+        """Test that a burst of file changes is committed and pushed once"""
+        user_dir = temp_storage_dir / "test_user_123"
+        user_dir.mkdir(parents=True, exist_ok=True)
+        config = {
+            "repo_url": "https://github.com/user/vault.git",
+            "branch": "main",
+            "stopped": False
+        }
+        (user_dir / "git_config.json").write_text(json.dumps(config))
+        monkeypatch.setattr(file_storage, "GIT_BATCH_WINDOW_SECONDS", 0.5)
+
+        with patch('tools.file_storage.setup_credential_store'), \
+             patch('tools.file_storage.get_token_from_store', return_value=None):
+            await file_storage.upload_file("first.md", "First")
+            await file_storage.upload_file("second.md", "Second")
+            await file_storage.wait_for_git_commits()
+
+        mock_git.git.add.assert_called_once_with("first.md", "second.md")
+        mock_git.index.commit.assert_called_once()
+        assert "2 files" in mock_git.index.commit.call_args[0][0]
+        mock_git.remotes.origin.push.assert_called_once_with("main")
+
     @pytest.mark.asyncio
     async def test_git_commit_skipped_when_no_config(self, temp_storage_dir, setup_user, mock_rag_api):
         """Test that Git commit is skipped when no git_config.json exists"""
@@ -626,7 +754,7 @@ class TestErrorHandling:
         """Test that file is cleaned up if RAG API indexing fails"""
         with patch('tools.file_storage.httpx.AsyncClient') as mock_client:
             mock_instance = AsyncMock()
-            mock_client.return_value.__aenter__.return_value = mock_instance
+            mock_client.return_value = mock_instance
 
             # Mock RAG API failure
             mock_instance.post.side_effect = httpx.RequestError("Connection failed")
@@ -638,6 +766,17 @@ class TestErrorHandling:
             file_path = temp_storage_dir / "test_user_123" / "obsidian_vault" / "test.txt"
             assert not file_path.exists()
 
+    @pytest.mark.asyncio
+    async def test_upload_write_failure_removes_rag_index(self, temp_storage_dir, setup_user, mock_rag_api):
+        """Test that embeddings indexed alongside a failed disk write are removed again"""
+        with patch('tools.file_storage._write_bytes', new=AsyncMock(side_effect=OSError("Disk full"))):
+            with pytest.raises(OSError, match="Disk full"):
+                await file_storage.upload_file("test.txt", "Content")
+
+        mock_rag_api.post.assert_called_once()
+        mock_rag_api.delete.assert_called_once()
+        assert "test.txt" in mock_rag_api.delete.call_args[0][0]
+
     @pytest.mark.asyncio
     async def test_git_commit_failure_non_blocking(self, temp_storage_dir, setup_user, mock_rag_api):
         """Test that Git commit failures don't block file operations"""
@@ -664,6 +803,7 @@ class TestErrorHandling:
             # File operation should still succeed
             result = await file_storage.upload_file("test.txt", "Test content")
             assert "Successfully uploaded" in result
+            await file_storage.wait_for_git_commits()
 
             # Verify file exists
             file_path = temp_storage_dir / "test_user_123" / "obsidian_vault" / "test.txt"
@@ -831,6 +971,77 @@ class TestSearchFiles:
                 assert "relevance:" in result
 
 
+    @pytest.mark.asyncio
+    async def test_search_files_reuses_results_for_similar_query(self, temp_storage_dir, setup_user):
+        """Test that a near-identical query embedding is answered from the semantic cache"""
+        matches = [{"content": "Cached content", "relevance": 0.9, "filename": "note.md"}]
+        embeddings = iter([[0.1, 0.2, 0.3], [0.1, 0.2, 0.3001]])
+
+        with patch('tools.file_storage._get_query_embedding', side_effect=lambda q, u: next(embeddings)), \
+             patch('tools.file_storage._query_vectordb_direct', new=AsyncMock(return_value=matches)) as mock_query:
+            first = await file_storage.search_files("meeting notes")
+            second = await file_storage.search_files("meeting notes?")
+
+            assert mock_query.await_count == 1
+            assert "note.md" in first
+            assert "note.md" in second
+
+    @pytest.mark.asyncio
+    async def test_search_cache_invalidated_on_file_change(self, temp_storage_dir, setup_user):
+        """Test that uploading a file drops the user's cached search results"""
+        matches = [{"content": "Old content", "relevance": 0.9, "filename": "note.md"}]
+
+        with patch('tools.file_storage._get_query_embedding', return_value=[0.1, 0.2, 0.3]), \
+             patch('tools.file_storage._query_vectordb_direct', new=AsyncMock(return_value=matches)) as mock_query, \
+             patch('tools.file_storage._index_in_rag_api', new=AsyncMock()):
+            await file_storage.search_files("meeting notes")
+            await file_storage.upload_file("new.md", "New content")
+            await file_storage.search_files("meeting notes")
+
+            assert mock_query.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_search_results_not_cached_when_upload_overlaps_query(self, temp_storage_dir, setup_user):
+        """Test that results of a query in flight during an upload are not cached"""
+        import asyncio
+        matches = [{"content": "Old content", "relevance": 0.9, "filename": "note.md"}]
+        release = asyncio.Event()
+
+        async def slow_query(embedding, user_id, max_results):
+            await release.wait()
+            return matches
+
+        with patch('tools.file_storage._get_query_embedding', return_value=[0.1, 0.2, 0.3]), \
+             patch('tools.file_storage._query_vectordb_direct', new=AsyncMock(side_effect=slow_query)) as mock_query, \
+             patch('tools.file_storage._index_in_rag_api', new=AsyncMock()):
+            search = asyncio.create_task(file_storage.search_files("meeting notes"))
+            while not mock_query.await_count:
+                await asyncio.sleep(0)
+            await file_storage.upload_file("new.md", "New content")
+            release.set()
+            await search
+
+            await file_storage.search_files("meeting notes")
+            assert mock_query.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_search_cache_invalidated_when_worker_reindexes(self, temp_storage_dir, setup_user):
+        """Test that a rewritten hash database drops the user's cached search results"""
+        from shared.storage import get_user_storage_path
+        matches = [{"content": "Old content", "relevance": 0.9, "filename": "note.md"}]
+        hash_db = get_user_storage_path("test_user_123") / "sync_hashes.json"
+
+        with patch('tools.file_storage._get_query_embedding', return_value=[0.1, 0.2, 0.3]), \
+             patch('tools.file_storage._query_vectordb_direct', new=AsyncMock(return_value=matches)) as mock_query:
+            await file_storage.search_files("meeting notes")
+            await file_storage.search_files("meeting notes")
+            assert mock_query.await_count == 1
+
+            hash_db.write_text('{"note.md": "abc"}')
+            await file_storage.search_files("meeting notes")
+            assert mock_query.await_count == 2
+
+
 class TestQueryEmbedding:
     """Test query embedding functionality for semantic search"""
 
@@ -839,7 +1050,7 @@ class TestQueryEmbedding:
         """Test that /local/embed endpoint is tried first"""
         with patch('tools.file_storage.httpx.AsyncClient') as mock_client:
             mock_instance = AsyncMock()
-            mock_client.return_value.__aenter__.return_value = mock_instance
+            mock_client.return_value = mock_instance
 
             # Mock successful /local/embed response
             mock_response = MagicMock()
@@ -866,7 +1077,7 @@ class TestQueryEmbedding:
 
         with patch('tools.file_storage.httpx.AsyncClient') as mock_client:
             mock_instance = AsyncMock()
-            mock_client.return_value.__aenter__.return_value = mock_instance
+            mock_client.return_value = mock_instance
 
             # Mock /local/embed returns 404 (doesn't exist)
             local_embed_response = MagicMock()
@@ -938,7 +1149,7 @@ class TestQueryEmbedding:
 
         with patch('tools.file_storage.httpx.AsyncClient') as mock_client:
             mock_instance = AsyncMock()
-            mock_client.return_value.__aenter__.return_value = mock_instance
+            mock_client.return_value = mock_instance
 
             # Mock /local/embed doesn't exist
             local_embed_response = MagicMock()
@@ -997,7 +1208,7 @@ class TestQueryEmbedding:
 
         with patch('tools.file_storage.httpx.AsyncClient') as mock_client:
             mock_instance = AsyncMock()
-            mock_client.return_value.__aenter__.return_value = mock_instance
+            mock_client.return_value = mock_instance
 
             # Mock /local/embed doesn't exist
             local_embed_response = MagicMock()
@@ -1043,7 +1254,7 @@ class TestQueryEmbedding:
         """Test error handling when embedding is not found in database"""
         with patch('tools.file_storage.httpx.AsyncClient') as mock_client:
             mock_instance = AsyncMock()
-            mock_client.return_value.__aenter__.return_value = mock_instance
+            mock_client.return_value = mock_instance
 
             # Mock /local/embed doesn't exist
             local_embed_response = MagicMock()
@@ -1078,6 +1289,48 @@ class TestQueryEmbedding:
 
                 mock_conn.close.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_get_query_embedding_skips_local_embed_after_404(self, setup_user):
+        """Test that a 404 from /local/embed is remembered until the retry window passes"""
+        with patch('tools.file_storage.httpx.AsyncClient') as mock_client:
+            mock_instance = AsyncMock()
+            mock_client.return_value = mock_instance
+
+            not_found = MagicMock()
+            not_found.status_code = 404
+            embed_response = MagicMock()
+            embed_response.status_code = 200
+
+            def post_side_effect(url, **kwargs):
+                return not_found if "/local/embed" in url else embed_response
+
+            mock_instance.post.side_effect = post_side_effect
+
+            mock_row = MagicMock()
+            mock_row.__getitem__ = lambda self, key: [0.1, 0.2] if key == 'embedding' else None
+            mock_row.get = lambda key, default=None: [0.1, 0.2] if key == 'embedding' else default
+            mock_conn = AsyncMock()
+            mock_conn.fetchrow = AsyncMock(return_value=mock_row)
+
+            with patch('asyncpg.connect', return_value=mock_conn), \
+                 patch('tools.file_storage.register_vector', new=AsyncMock()), \
+                 patch('tools.file_storage._generate_jwt_token', return_value="test_token"):
+
+                await file_storage._get_query_embedding("first query", "test_user_123")
+                await file_storage._get_query_embedding("second query", "test_user_123")
+
+                urls = [call[0][0] for call in mock_instance.post.call_args_list]
+                assert urls.count("/local/embed") == 1
+                assert urls.count("/embed") == 2
+
+                # Once the retry window has passed, /local/embed is probed again
+                file_storage._local_embed_retry_at -= file_storage.LOCAL_EMBED_RETRY_SECONDS
+                await file_storage._get_query_embedding("third query", "test_user_123")
+
+                urls = [call[0][0] for call in mock_instance.post.call_args_list]
+                assert urls.count("/local/embed") == 2
+                assert urls.count("/embed") == 3
+
 
 class TestFileSearchExclusions:
     """Test that file search excludes git files, hash files, and root directory files"""
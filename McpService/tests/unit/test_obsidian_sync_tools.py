@@ -7,6 +7,7 @@ import tempfile
 from pathlib import Path
 import sys
 import os
+from unittest.mock import patch
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
@@ -156,3 +157,243 @@ async def test_auto_configure_obsidian_sync_skips_if_unchanged(temp_storage):
     second_mtime = config_path.stat().st_mtime
     # Allow small difference due to filesystem precision
     assert abs(second_mtime - first_mtime) < 0.5
+
+
+def test_get_vault_stats_skips_hidden_directories(tmp_path):
+    """Test that vault stats count markdown files outside hidden directories"""
+    from tools.obsidian_sync import _get_vault_stats
+
+    vault = tmp_path / "obsidian_vault"
+    (vault / "notes" / "deep").mkdir(parents=True)
+    (vault / ".obsidian").mkdir()
+    (vault / "root.md").write_text("a")
+    (vault / "notes" / "deep" / "nested.md").write_text("b")
+    (vault / "notes" / "image.png").write_text("c")
+    (vault / ".obsidian" / "hidden.md").write_text("d")
+
+    hash_db = tmp_path / "sync_hashes.json"
+    hash_db.write_text(json.dumps({str(vault / "root.md"): "hash"}))
+
+    assert _get_vault_stats(vault, hash_db) == (2, 1)
+
+
+def test_get_vault_stats_matches_relative_and_legacy_keys(tmp_path):
+    """Test that relative hash keys and legacy absolute keys both count as synced"""
+    from tools.obsidian_sync import _get_vault_stats
+
+    vault = tmp_path / "obsidian_vault"
+    (vault / "notes").mkdir(parents=True)
+    (vault / "root.md").write_text("a")
+    (vault / "notes" / "nested.md").write_text("b")
+    (vault / "notes" / "other.md").write_text("c")
+
+    hash_db = tmp_path / "sync_hashes.json"
+    hash_db.write_text(json.dumps({
+        "notes/nested.md": "hash",
+        str(vault / "root.md"): "hash",
+        "notes/deleted.md": "hash",
+    }))
+
+    assert _get_vault_stats(vault, hash_db) == (3, 2)
+
+
+def test_get_vault_stats_cached_until_hash_db_changes(tmp_path):
+    """Test that vault stats are reused until the hash database changes"""
+    from tools.obsidian_sync import _get_vault_stats
+
+    vault = tmp_path / "obsidian_vault"
+    (vault / "notes").mkdir(parents=True)
+    (vault / "root.md").write_text("a")
+    hash_db = tmp_path / "sync_hashes.json"
+    hash_db.write_text(json.dumps({}))
+
+    assert _get_vault_stats(vault, hash_db) == (1, 0)
+
+    # A nested change does not touch the vault root, so the cached result is served
+    (vault / "notes" / "new.md").write_text("b")
+    assert _get_vault_stats(vault, hash_db) == (1, 0)
+
+    hash_db.write_text(json.dumps({str(vault / "root.md"): "hash"}))
+    assert _get_vault_stats(vault, hash_db) == (2, 1)
+
+
+@pytest.mark.asyncio
+async def test_get_obsidian_sync_status_reports_progress(temp_storage):
+    """Test that the status report includes vault sync progress"""
+    from shared.storage import set_current_user, get_user_storage_path, get_user_vault_path
+    from tools.obsidian_sync import get_obsidian_sync_status
+
+    user_id = "test-user-status"
+    set_current_user(user_id)
+    await auto_configure_obsidian_sync(user_id, "https://github.com/test/vault.git", "test-token")
+
+    vault = get_user_vault_path(user_id)
+    (vault / "one.md").write_text("a")
+    (vault / "two.md").write_text("b")
+    (get_user_storage_path(user_id) / "sync_hashes.json").write_text(json.dumps({str(vault / "one.md"): "hash"}))
+
+    result = await get_obsidian_sync_status()
+
+    assert "**Progress:** 1/2 files (50.0%)" in result
+    assert "✅ **ACTIVE**" in result
+
+
+@pytest.mark.asyncio
+async def test_get_obsidian_sync_status_skips_walk_without_hash_db(temp_storage):
+    """Test that the vault is not walked before the first indexing pass"""
+    from shared.storage import set_current_user, get_user_vault_path
+    from tools.obsidian_sync import get_obsidian_sync_status
+
+    user_id = "test-user-status-fresh"
+    set_current_user(user_id)
+    await auto_configure_obsidian_sync(user_id, "https://github.com/test/vault.git", "test-token")
+    (get_user_vault_path(user_id) / "one.md").write_text("a")
+
+    with patch("tools.obsidian_sync._compute_vault_stats") as mock_compute:
+        result = await get_obsidian_sync_status()
+
+    mock_compute.assert_not_called()
+    assert "**Progress:** Waiting for initial indexing" in result
+
+
+def test_credential_store_round_trip_in_git_format(monkeypatch, tmp_path):
+    """Test that tokens are stored in git-credential-store format and read back newest first"""
+    import shared.storage
+    from shared.git_credentials import setup_credential_store, get_token_from_store
+    monkeypatch.setattr(shared.storage, "STORAGE_ROOT", tmp_path)
+
+    setup_credential_store("cred-user", "https://github.com/test/vault.git", "old-token")
+    setup_credential_store("cred-user", "https://gitlab.com/test/other.git", "gitlab-token")
+    setup_credential_store("cred-user", "https://github.com/test/vault.git", "new/token")
+
+    cred_file = tmp_path / "cred-user" / ".git-credentials"
+    assert cred_file.read_text().splitlines() == [
+        "https://new%2Ftoken:@github.com",
+        "https://gitlab-token:@gitlab.com",
+    ]
+    assert get_token_from_store("cred-user", "https://github.com/test/vault.git") == "new/token"
+    assert get_token_from_store("cred-user", "https://example.com/test/vault.git") is None
+
+
+def test_credential_store_not_rewritten_for_unchanged_token(monkeypatch, tmp_path):
+    """Test that storing the token already on file leaves the credential store untouched"""
+    import shared.storage
+    from shared import git_credentials
+    monkeypatch.setattr(shared.storage, "STORAGE_ROOT", tmp_path)
+
+    git_credentials.setup_credential_store("cred-user", "https://github.com/test/vault.git", "token")
+    with patch.object(git_credentials.os, "open") as mock_open:
+        git_credentials.setup_credential_store("cred-user", "https://github.com/test/vault.git", "token")
+
+    mock_open.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_reset_obsidian_sync_failures_rewrites_config(temp_storage):
+    """Test that resetting failures clears the stopped state and leaves no temp file behind"""
+    from shared.storage import set_current_user, get_user_storage_path
+    from tools.obsidian_sync import reset_obsidian_sync_failures
+
+    user_id = "test-user-reset"
+    set_current_user(user_id)
+    config_path = get_user_storage_path(user_id) / "git_config.json"
+    config_path.write_text(json.dumps({
+        "repo_url": "https://github.com/test/vault.git",
+        "failure_count": 5,
+        "stopped": True,
+        "last_failure_error": "push rejected"
+    }))
+
+    result = await reset_obsidian_sync_failures()
+
+    assert "Successfully reset" in result
+    config = json.loads(config_path.read_text())
+    assert config["failure_count"] == 0
+    assert config["stopped"] is False
+    assert "last_failure_error" not in config
+    assert not config_path.with_suffix(".tmp").exists()
+
+
+@pytest.mark.parametrize("remaining, expected", [
+    (0, None),
+    (10, "1 minute"),
+    (25, "3 minutes"),
+    (10 * 61, "1 hour and 1 minute"),
+    (10 * (24 * 60 + 1), "1 day and 1 minute"),
+])
+def test_calculate_eta(monkeypatch, remaining, expected):
+    """Test ETA formatting from the worker cycle settings"""
+    import tools.obsidian_sync
+    monkeypatch.setattr(tools.obsidian_sync, "FILES_PER_CYCLE", 10)
+    monkeypatch.setattr(tools.obsidian_sync, "SYNC_INTERVAL_SECONDS", 60)
+
+    assert tools.obsidian_sync._calculate_eta(remaining) == expected
+
+
+@pytest.mark.parametrize("interval, expected", [
+    (29, "less than 1 minute"),
+    (30, "1 minute"),
+    (90, "2 minutes"),
+])
+def test_calculate_eta_rounds_half_minutes_up(monkeypatch, interval, expected):
+    """Test that partial minutes are rounded half up instead of to even"""
+    import tools.obsidian_sync
+    monkeypatch.setattr(tools.obsidian_sync, "FILES_PER_CYCLE", 10)
+    monkeypatch.setattr(tools.obsidian_sync, "SYNC_INTERVAL_SECONDS", interval)
+
+    assert tools.obsidian_sync._calculate_eta(1) == expected
+
+
+@pytest.mark.asyncio
+async def test_force_complete_reindex_deletes_hash_db(temp_storage):
+    """Test that a reindex removes the hash database and reports when none existed"""
+    from shared.storage import set_current_user, get_user_storage_path
+    from tools.obsidian_sync import force_complete_reindex
+
+    set_current_user("test-user-reindex")
+    hash_db = get_user_storage_path("test-user-reindex") / "sync_hashes.json"
+    hash_db.write_text("{}")
+    meta_db = hash_db.with_name("sync_meta.json")
+    meta_db.write_text("{}")
+    indexed_head = hash_db.with_name("indexed_head")
+    indexed_head.write_text("abc")
+    cleanup_head = hash_db.with_name("hidden_cleanup_head")
+    cleanup_head.write_text("abc")
+
+    from tools import file_storage
+    file_storage._search_cache["test-user-reindex"] = []
+
+    assert "All files will be refreshed" in await force_complete_reindex()
+    assert "test-user-reindex" not in file_storage._search_cache
+    assert not hash_db.exists()
+    assert not meta_db.exists()
+    assert not indexed_head.exists()
+    assert not cleanup_head.exists()
+    assert "No existing index was found" in await force_complete_reindex()
+
+
+@pytest.mark.asyncio
+async def test_configure_obsidian_sync_updates_token_only(temp_storage, monkeypatch):
+    """Test that supplying only a token rotates it for the configured repository"""
+    import tools.obsidian_sync
+    from shared.storage import set_current_user, get_user_storage_path
+
+    user_id = "test-user-rotate"
+    set_current_user(user_id)
+    await configure_obsidian_sync(repo_url="https://github.com/test/vault.git", token="old-token", branch="dev")
+
+    config_path = get_user_storage_path(user_id) / "git_config.json"
+    config = json.loads(config_path.read_text())
+    config.update({"failure_count": 5, "stopped": True})
+    config_path.write_text(json.dumps(config))
+
+    stored = []
+    monkeypatch.setattr(tools.obsidian_sync, "setup_credential_store", lambda *args: stored.append(args))
+    result = await configure_obsidian_sync(token="new-token")
+
+    assert "Successfully updated the token" in result
+    assert stored == [(user_id, "https://github.com/test/vault.git", "new-token")]
+    config = json.loads(config_path.read_text())
+    assert config["branch"] == "dev"
+    assert config["stopped"] is False
+    assert config["failure_count"] == 0
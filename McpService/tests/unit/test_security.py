@@ -36,7 +36,7 @@ def mock_rag_api():
     """Mock the RAG API HTTP client"""
     with patch('tools.file_storage.httpx.AsyncClient') as mock_client:
         mock_instance = AsyncMock()
-        mock_client.return_value.__aenter__.return_value = mock_instance
+        mock_client.return_value = mock_instance
 
         # Mock successful responses
         mock_response = MagicMock()
@@ -89,3 +89,18 @@ async def test_list_files_path_traversal(temp_storage_dir, setup_user):
 
     assert "secret.txt" not in result
     assert "Error" in result
+
+
+def test_vault_paths_keep_name_through_symlinked_directory(temp_storage_dir, setup_user):
+    """Test that a note reached through a symlinked folder keeps its vault-relative name"""
+    from shared.storage import get_user_vault_path
+    vault = get_user_vault_path("test_user_123")
+    (vault / "archive" / "notes").mkdir(parents=True)
+    (vault / "archive" / "notes" / "a.md").write_text("A")
+    (vault / "notes").symlink_to(vault / "archive" / "notes")
+
+    path, name = file_storage._get_vault_paths("test_user_123", "notes/a.md")
+
+    assert path == (vault / "archive" / "notes" / "a.md").resolve()
+    assert name == "obsidian_vault/notes/a.md"
+    assert file_storage.get_file_id("test_user_123", name) == "user_test_user_123_obsidian_vault/notes/a.md"
@@ -3,30 +3,31 @@ File Storage Tools for ObsidianSyncMCP Server
 
 Provides user-isolated file storage with semantic search via RAG API integration.
 All file operations are scoped to the authenticated user via user_id from request headers.
-All file changes trigger Git commit and push (if Git is configured) and RAG indexing.
+All file changes trigger RAG indexing and a background Git commit and push (if Git is configured).
 """
 
 import os
-import io
 import json
 import httpx
-import aiofiles
 import asyncio
-import subprocess
 import re
 import sys
 import jwt
-import urllib.parse
 import asyncpg
+import time
+import numpy as np
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
-from datetime import datetime, timedelta
+from urllib.parse import quote
+from typing import List, Dict, Optional, Set, Tuple
+from datetime import datetime, timezone
 from git import Repo, GitCommandError
 from pgvector.asyncpg import register_vector, Vector
 
 # Ensure parent directory is in path for relative imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from shared.storage import get_current_user, get_user_storage_path, get_user_vault_path
+from shared import git_credentials
+from shared.git_credentials import clean_remote_url, get_credential_file, get_token_from_store
 
 # API and Network Configuration
 RAG_API_URL = os.environ.get("RAG_API_URL", "http://librechat-rag-api:8000")
@@ -47,110 +48,121 @@ VECTORDB_DB = os.environ.get("VECTORDB_DB", "mydatabase")
 VECTORDB_USER = os.environ.get("VECTORDB_USER", "myuser")
 VECTORDB_PASSWORD = os.environ.get("VECTORDB_PASSWORD", "mypassword")
 
-def clean_remote_url(url: str) -> str:
-    """Remove authentication tokens from a Git remote URL."""
-    if not url:
-        return url
-    return re.sub(r'^(https?://)[^@/]+@', r'\1', url)
-
-def setup_credential_store(repo: Repo, user_id: str, repo_url: str, token: str) -> None:
-    """Configure Git to use persistent credential store for the user's token."""
-    user_storage = get_user_storage_path(user_id)
-    cred_file = user_storage / ".git-credentials"
-    cred_file.parent.mkdir(parents=True, exist_ok=True)
-
-    repo.git.config("credential.helper", f"store --file={cred_file}")
-
-    if not token:
-        return
-
-    url_match = re.match(r'^(https?://)([^/]+)(/.*)?$', repo_url)
-    if not url_match:
-        return
-
-    protocol, host_part, path = url_match.groups()
-    host = host_part.split("@")[-1]
-    path = path or "/"
-
-    credential_input = f"protocol={protocol.rstrip('://')}\nhost={host}\npath={path}\nusername={token}\npassword=\n\n"
-
-    try:
-        subprocess.run(
-            ["git", "-c", f"credential.helper=store --file={cred_file}", "credential", "approve"],
-            input=credential_input.encode("utf-8"),
-            check=True,
-            capture_output=True
+# Shared RAG API client (created lazily so it binds to the running event loop)
+RAG_MAX_CONNECTIONS = 100
+RAG_MAX_KEEPALIVE_CONNECTIONS = 50
+_rag_client: Optional[httpx.AsyncClient] = None
+
+# After the RAG API answers 404 for /local/embed, searches skip straight to the /embed fallback
+# until this monotonic deadline, then probe again in case the endpoint was only briefly missing
+LOCAL_EMBED_RETRY_SECONDS = float(os.environ.get("LOCAL_EMBED_RETRY_SECONDS", "300"))
+_local_embed_retry_at = 0.0
+
+# Prefix of vault file names in RAG metadata and file IDs
+VAULT_FILE_PREFIX = "obsidian_vault/"
+
+# Characters stripped from note titles when deriving a filename
+_TITLE_UNSAFE = re.compile(r'[^\w\s-]')
+
+# Semantic search cache: per-user LRU of recent query embeddings and their results
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", "128"))
+SEARCH_CACHE_TTL_SECONDS = float(os.environ.get("SEARCH_CACHE_TTL_SECONDS", "300"))
+SEARCH_CACHE_SIMILARITY = float(os.environ.get("SEARCH_CACHE_SIMILARITY", "0.95"))
+_search_cache: Dict[str, List[Tuple[np.ndarray, int, List[Dict], float]]] = {}
+# (mtime_ns, size) of the user's sync_hashes.json when their cached results were stored;
+# the Worker rewrites that file whenever it re-indexes, which makes the results stale
+_search_cache_fingerprints: Dict[str, Optional[Tuple[int, int]]] = {}
+# Bumped on every invalidation so a query that was in flight meanwhile does not store its results
+_search_cache_generations: Dict[str, int] = {}
+
+# Parsed git_config.json per config path (None when absent), re-read after the TTL
+# so changes written by the Worker are eventually picked up
+GIT_CONFIG_CACHE_TTL_SECONDS = float(os.environ.get("GIT_CONFIG_CACHE_TTL_SECONDS", "60"))
+_git_config_cache: Dict[Path, Tuple[Optional[Dict], float]] = {}
+
+# Vault path -> remote URL whose origin and credential store were set up by a successful push
+_git_remotes_ready: Dict[Path, str] = {}
+
+# Git commit batching: one queue and worker task per user with pending changes
+GIT_BATCH_WINDOW_SECONDS = float(os.environ.get("GIT_BATCH_WINDOW_SECONDS", "2.0"))
+GIT_MAX_BATCH_SIZE = 50
+_git_queues: Dict[str, asyncio.Queue] = {}
+
+# In-flight background Git workers (referenced here so they are not garbage collected)
+_git_tasks: Set[asyncio.Task] = set()
+
+async def _get_rag_client() -> httpx.AsyncClient:
+    """Return the shared RAG API client, creating it on first use."""
+    global _rag_client
+    if _rag_client is None or _rag_client.is_closed:
+        _rag_client = httpx.AsyncClient(
+            base_url=RAG_API_URL,
+            timeout=NETWORK_TIMEOUT_SECONDS,
+            limits=httpx.Limits(
+                max_connections=RAG_MAX_CONNECTIONS,
+                max_keepalive_connections=RAG_MAX_KEEPALIVE_CONNECTIONS
+            )
         )
-    except subprocess.CalledProcessError as e:
-        print(f"Warning: Failed to store credentials for user {user_id}: {e}")
-
-def get_token_from_store(user_id: str, repo_url: str) -> Optional[str]:
-    """Retrieve the token for a repository from the persistent Git store."""
-    user_storage = get_user_storage_path(user_id)
-    cred_file = user_storage / ".git-credentials"
-    if not cred_file.exists():
-        return None
-
-    url_match = re.match(r'^(https?://)([^/]+)(/.*)?$', repo_url)
-    if not url_match:
-        return None
+    return _rag_client
 
-    protocol, host_part, path = url_match.groups()
-    host = host_part.split("@")[-1]
-    path = path or "/"
+async def close_rag_client() -> None:
+    """Close the shared RAG API client and release pooled connections."""
+    global _rag_client
+    if _rag_client is not None:
+        await _rag_client.aclose()
+        _rag_client = None
 
-    credential_request = f"protocol={protocol.rstrip('://')}\nhost={host}\npath={path}\n"
+def setup_credential_store(repo: Repo, user_id: str, repo_url: str, token: str) -> None:
+    """Configure Git to use persistent credential store for the user's token."""
+    repo.git.config("credential.helper", f"store --file={get_credential_file(user_id)}")
+    git_credentials.setup_credential_store(user_id, repo_url, token)
 
-    try:
-        result = subprocess.run(
-            ["git", "-c", f"credential.helper=store --file={cred_file}", "credential", "fill"],
-            input=credential_request.encode("utf-8"),
-            check=True,
-            capture_output=True
-        )
-        for line in result.stdout.decode("utf-8").splitlines():
-            if line.startswith("username="):
-                return line.split("=", 1)[1]
-    except subprocess.CalledProcessError:
-        return None
-    return None
+def _embed_path(file_id: str) -> str:
+    """Build the RAG API path for a file's embeddings; file IDs always contain '/' so they are quoted."""
+    return f"/embed/{quote(file_id, safe='')}"
 
 def get_file_id(user_id: str, filename: str) -> str:
     """Generate a unique file ID for vectordb scoping."""
     return f"user_{user_id}_{filename}"
 
+def _is_within(path: Path, root: Path) -> bool:
+    """Check whether a path is root itself or below it, without relative_to's exception cost."""
+    path_str = str(path)
+    root_str = str(root)
+    return path_str == root_str or path_str.startswith(root_str + os.sep)
+
 def _get_vault_paths(user_id: str, filename: str) -> Tuple[Path, str]:
     """Get consistent absolute path and vault-relative filename with traversal protection."""
     vault_dir = get_user_vault_path(user_id).resolve()
     clean_name = filename.lstrip('/')
 
-    vault_prefix = "obsidian_vault/"
-    if clean_name.startswith(vault_prefix):
-        clean_name = clean_name[len(vault_prefix):]
+    if clean_name.startswith(VAULT_FILE_PREFIX):
+        clean_name = clean_name[len(VAULT_FILE_PREFIX):]
 
     # joinpath and resolve to prevent traversal
     target_path = (vault_dir / clean_name).resolve()
 
     # Ensure the target path is still within the vault directory
-    try:
-        target_path.relative_to(vault_dir)
-    except ValueError:
+    if not _is_within(target_path, vault_dir):
         raise ValueError(f"Security error: path traversal detected for '{filename}'")
 
-    return target_path, f"{vault_prefix}{clean_name}"
+    # The resolved path is only used for containment; the name keeps the caller's path so
+    # file IDs already stored in the RAG index still match for symlinked directories
+    return target_path, f"{VAULT_FILE_PREFIX}{clean_name}"
 
 def _should_exclude_file(file_path: Path, vault_dir: Path) -> bool:
     """Check if a file should be excluded from search and listing."""
-    try:
-        relative_path = file_path.relative_to(vault_dir)
-    except ValueError:
+    vault_prefix = str(vault_dir) + os.sep
+    path_str = str(file_path)
+    if not path_str.startswith(vault_prefix):
         return True
 
-    path_parts = relative_path.parts
-    if '.git' in path_parts or any(part.startswith('.') for part in path_parts):
-        return True
+    # Hidden parts (including .git) are excluded
+    return any(part.startswith('.') for part in path_str[len(vault_prefix):].split(os.sep))
 
-    return False
+def _utc_iso() -> str:
+    """Current UTC time as an ISO 8601 string with second precision."""
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
 
 def _generate_jwt_token(user_id: str) -> str:
     """Generate a JWT token for RAG API authentication."""
@@ -160,72 +172,154 @@ def _generate_jwt_token(user_id: str) -> str:
     try:
         payload = {
             "id": user_id,
-            "exp": datetime.utcnow() + timedelta(minutes=JWT_EXPIRATION_MINUTES)
+            "exp": int(time.time()) + JWT_EXPIRATION_MINUTES * 60
         }
         return jwt.encode(payload, RAG_API_JWT_SECRET, algorithm="HS256")
     except Exception:
         return ""
 
+async def _read_text(file_path: Path) -> str:
+    """Read a text file in one worker-thread hop, keeping the event loop free of file I/O."""
+    return await asyncio.to_thread(file_path.read_text, encoding="utf-8")
+
+def _content_matches(file_path: Path, data: bytes) -> bool:
+    """Check whether a file already holds exactly these bytes, reading it only if the size matches."""
+    return file_path.stat().st_size == len(data) and file_path.read_bytes() == data
+
+async def _write_bytes(file_path: Path, data: bytes) -> None:
+    """Write already-encoded content in one worker-thread hop."""
+    await asyncio.to_thread(file_path.write_bytes, data)
+
 async def _load_git_config(user_id: str) -> Optional[Dict]:
-    """Load Git synchronization configuration for a user."""
+    """Load Git synchronization configuration for a user, cached for GIT_CONFIG_CACHE_TTL_SECONDS."""
     user_dir = get_user_storage_path(user_id)
     config_path = user_dir / "git_config.json"
 
-    if not config_path.exists():
-        return None
-
-    try:
-        async with aiofiles.open(config_path, 'r', encoding='utf-8') as f:
-            return json.loads(await f.read())
-    except (json.JSONDecodeError, IOError) as e:
-        print(f"Warning: Failed to read Git config: {e}")
-        return None
+    cached = _git_config_cache.get(config_path)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
 
-async def _trigger_git_commit(user_id: str, file_path: Path, is_delete: bool = False) -> None:
-    """Commit and push file changes to the user's Obsidian vault repository."""
-    config = await _load_git_config(user_id)
-    if not config or config.get('stopped', False):
-        return
-
-    repo_url = config.get('repo_url')
+    config = None
+    if config_path.exists():
+        try:
+            config = json.loads(await _read_text(config_path))
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Warning: Failed to read Git config: {e}")
+            return None
+
+    _git_config_cache[config_path] = (config, time.monotonic() + GIT_CONFIG_CACHE_TTL_SECONDS)
+    return config
+
+def invalidate_git_config(user_id: str) -> None:
+    """Forget the cached Git configuration and remote setup after git_config.json is rewritten."""
+    _git_config_cache.pop(get_user_storage_path(user_id) / "git_config.json", None)
+    _git_remotes_ready.pop(get_user_vault_path(user_id), None)
+
+def _commit_changes_sync(user_id: str, config: Dict, latest_changes: Dict[str, bool]) -> None:
+    """Stage, commit and push a batch of changes; blocking, so it runs in a worker thread."""
+    repo_url = config['repo_url']
     branch = config.get('branch', 'main')
-    if not repo_url:
-        return
-
-    token = config.get('token') or get_token_from_store(user_id, repo_url)
     vault_path = get_user_vault_path(user_id)
 
-    try:
-        repo = Repo(vault_path)
-        relative_path = file_path.relative_to(vault_path)
-
+    repo = Repo(vault_path)
+    added = []
+    for relative_path, is_delete in latest_changes.items():
         if is_delete:
             try:
-                repo.git.rm(str(relative_path))
+                repo.git.rm(relative_path)
             except GitCommandError:
                 pass
         else:
-            repo.git.add(str(relative_path))
+            added.append(relative_path)
 
-        if repo.is_dirty(untracked_files=True) or is_delete:
+    if added:
+        repo.git.add(*added)
+
+    # Only the index matters here: a staged-diff check avoids a full working-tree status scan
+    if repo.git.diff('--cached', '--name-only'):
+        timestamp = _utc_iso()
+        if len(latest_changes) == 1:
+            relative_path, is_delete = next(iter(latest_changes.items()))
             action = "Delete" if is_delete else "Update"
-            timestamp = datetime.utcnow().isoformat()
-            repo.index.commit(f"{action} {file_path.name} from LibreChat: {timestamp}")
+            repo.index.commit(f"{action} {os.path.basename(relative_path)} from LibreChat: {timestamp}")
+        else:
+            repo.index.commit(f"Update {len(latest_changes)} files from LibreChat: {timestamp}")
 
-            clean_url = clean_remote_url(repo_url)
-            if 'origin' in repo.remotes:
-                repo.remotes.origin.set_url(clean_url)
-            else:
+        # The remote URL and credential store persist in the repo, so set them up once per process
+        clean_url = clean_remote_url(repo_url)
+        if _git_remotes_ready.get(vault_path) != clean_url:
+            if 'origin' not in repo.remotes:
                 repo.create_remote('origin', clean_url)
-
+            elif repo.remotes.origin.url != clean_url:
+                repo.remotes.origin.set_url(clean_url)
+            token = config.get('token') or get_token_from_store(user_id, repo_url)
             setup_credential_store(repo, user_id, repo_url, token)
-            repo.remotes.origin.push(branch)
 
+        repo.remotes.origin.push(branch)
+        _git_remotes_ready[vault_path] = clean_url
+
+async def _trigger_git_commit(user_id: str, changes: List[Tuple[str, bool]]) -> None:
+    """Commit and push a batch of file changes to the user's Obsidian vault repository.
+
+    Each change is a (vault-relative path, is_delete) pair; when a path appears more than once
+    the latest change wins. The whole batch is recorded as a single commit and push,
+    run in a worker thread so Git subprocesses do not block the event loop.
+    """
+    config = await _load_git_config(user_id)
+    if not config or config.get('stopped', False) or not config.get('repo_url'):
+        return
+
+    latest_changes = dict(changes)
+    try:
+        await asyncio.to_thread(_commit_changes_sync, user_id, config, latest_changes)
     except (GitCommandError, ValueError, Exception) as e:
-        print(f"Warning: Git operation failed for {file_path}: {e}")
+        names = ", ".join(latest_changes)
+        print(f"Warning: Git operation failed for {names}: {e}")
+
+async def _git_commit_worker(user_id: str, queue: asyncio.Queue) -> None:
+    """Drain a user's queued file changes, committing each burst as a single push.
 
-async def _index_in_rag_api(user_id: str, filename: str, content: str, is_update: bool = False) -> None:
-    """Send file content to RAG API for embedding and indexing."""
+    After taking a change the worker waits up to GIT_BATCH_WINDOW_SECONDS for more,
+    so rapid successive edits share one commit. The worker exits once its queue is empty.
+    """
+    try:
+        while not queue.empty():
+            batch = []
+            while len(batch) < GIT_MAX_BATCH_SIZE:
+                if queue.empty():
+                    try:
+                        item = await asyncio.wait_for(queue.get(), timeout=GIT_BATCH_WINDOW_SECONDS)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = queue.get_nowait()
+                batch.append(item)
+            await _trigger_git_commit(user_id, batch)
+    finally:
+        if _git_queues.get(user_id) is queue:
+            del _git_queues[user_id]
+
+def _schedule_git_commit(user_id: str, relative_path: str, is_delete: bool = False) -> None:
+    """Queue a file change for a background Git commit so file operations return immediately.
+
+    Changes are serialized per user (avoiding .git/index.lock contention) while
+    different users commit in parallel.
+    """
+    queue = _git_queues.get(user_id)
+    if queue is None:
+        queue = _git_queues[user_id] = asyncio.Queue()
+        task = asyncio.create_task(_git_commit_worker(user_id, queue))
+        _git_tasks.add(task)
+        task.add_done_callback(_git_tasks.discard)
+    queue.put_nowait((relative_path, is_delete))
+
+async def wait_for_git_commits() -> None:
+    """Wait for all scheduled background Git commits to finish."""
+    while _git_tasks:
+        await asyncio.gather(*_git_tasks, return_exceptions=True)
+
+async def _index_in_rag_api(user_id: str, filename: str, data: bytes, is_update: bool = False) -> None:
+    """Send UTF-8 encoded file content to RAG API for embedding and indexing."""
     file_id = get_file_id(user_id, filename)
     token = _generate_jwt_token(user_id)
 
@@ -233,27 +327,38 @@ async def _index_in_rag_api(user_id: str, filename: str, content: str, is_update
     if token:
         headers["Authorization"] = f"Bearer {token}"
 
-    async with httpx.AsyncClient(timeout=NETWORK_TIMEOUT_SECONDS) as client:
-        if is_update:
-            await client.delete(f"{RAG_API_URL}/embed/{urllib.parse.quote(file_id, safe='')}", headers=headers)
+    client = await _get_rag_client()
+    if is_update:
+        await client.delete(_embed_path(file_id), headers=headers)
 
-        metadata = {
-            "user_id": user_id,
-            "filename": filename,
-            "size": len(content),
-            "updated_at" if is_update else "created_at": datetime.utcnow().isoformat()
-        }
+    metadata = {
+        "user_id": user_id,
+        "filename": filename,
+        "size": len(data),
+        "updated_at" if is_update else "created_at": _utc_iso()
+    }
+
+    form_data = {'file_id': file_id, 'storage_metadata': json.dumps(metadata)}
+    # httpx sends bytes as the multipart body directly, with no file-like wrapper to read back from
+    files = {'file': (Path(filename).name, data, 'text/markdown')}
+
+    multipart_headers = {k: v for k, v in headers.items() if k.lower() != 'content-type'}
 
-        form_data = {'file_id': file_id, 'storage_metadata': json.dumps(metadata)}
-        files = {'file': (Path(filename).name, io.BytesIO(content.encode('utf-8')), 'text/markdown')}
+    response = await client.post("/embed", files=files, data=form_data, headers=multipart_headers)
 
-        multipart_headers = {k: v for k, v in headers.items() if k.lower() != 'content-type'}
+    if response.status_code >= 400:
+        print(f"RAG API error for {filename} ({response.status_code}): {response.text[:500]}")
+    response.raise_for_status()
 
-        response = await client.post(f"{RAG_API_URL}/embed", files=files, data=form_data, headers=multipart_headers)
+async def _remove_from_rag_api(user_id: str, filename: str) -> None:
+    """Delete a file's embeddings from the RAG API."""
+    token = _generate_jwt_token(user_id)
+    headers = {"Accept": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
 
-        if response.status_code >= 400:
-            print(f"RAG API error for {filename} ({response.status_code}): {response.text[:500]}")
-        response.raise_for_status()
+    client = await _get_rag_client()
+    await client.delete(_embed_path(get_file_id(user_id, filename)), headers=headers)
 
 async def upload_file(filename: str, content: str) -> str:
     """Upload a new file to the vault and trigger synchronization."""
@@ -266,24 +371,89 @@ async def upload_file(filename: str, content: str) -> str:
     if file_path.exists():
         return f"Error: File '{filename}' already exists. Use modify_file to update it."
 
+    data = content.encode('utf-8')
     file_path.parent.mkdir(parents=True, exist_ok=True)
-    async with aiofiles.open(file_path, 'w', encoding='utf-8') as f:
-        await f.write(content)
 
-    try:
-        await _index_in_rag_api(user_id, full_name, content)
-    except Exception as e:
-        file_path.unlink()
-        raise RuntimeError(f"Failed to index file in RAG API: {e}")
+    # The RAG API receives the content in the request body, so indexing does not wait for the disk write
+    write_result, index_result = await asyncio.gather(
+        _write_bytes(file_path, data),
+        _index_in_rag_api(user_id, full_name, data),
+        return_exceptions=True
+    )
+    if isinstance(index_result, BaseException):
+        file_path.unlink(missing_ok=True)
+        raise RuntimeError(f"Failed to index file in RAG API: {index_result}")
+    if isinstance(write_result, BaseException):
+        try:
+            await _remove_from_rag_api(user_id, full_name)
+        except Exception as e:
+            print(f"Warning: Failed to remove file from RAG API: {e}")
+        raise write_result
 
-    await _trigger_git_commit(user_id, file_path)
-    return f"Successfully uploaded '{filename}' ({len(content)} bytes) to {file_path}"
+    invalidate_search_cache(user_id)
+    _schedule_git_commit(user_id, full_name[len(VAULT_FILE_PREFIX):])
+    return f"Successfully uploaded '{filename}' ({len(data)} bytes) to {file_path}"
 
 async def create_note(title: str, content: str) -> str:
     """Convenience tool to create a markdown note with a title header."""
-    safe_title = re.sub(r'[^\w\s-]', '', title).strip().replace(' ', '_')
+    safe_title = _TITLE_UNSAFE.sub('', title).strip().replace(' ', '_')
     return await upload_file(f"{safe_title}.md", f"# {title}\n\n{content}")
 
+def _count_tree(dir_path: str) -> Tuple[int, int]:
+    """Count the non-hidden files and directories below a directory."""
+    file_count = 0
+    dir_count = 0
+    stack = [dir_path]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir():
+                    dir_count += 1
+                    if not entry.is_symlink():
+                        stack.append(entry.path)
+                elif entry.is_file():
+                    file_count += 1
+    return file_count, dir_count
+
+def _scan_directory(target_dir: Path, vault_dir: Path) -> Tuple[List[Dict], List[Dict]]:
+    """Collect the non-hidden files and subdirectories of a vault directory.
+
+    Uses os.scandir so file sizes and timestamps come from one stat per entry.
+    Runs synchronously and is meant to be called via asyncio.to_thread.
+    """
+    files = []
+    subdirs = []
+
+    rel_prefix = str(target_dir)[len(str(vault_dir)) + 1:]
+    if any(part.startswith('.') for part in rel_prefix.split(os.sep) if part):
+        return files, subdirs
+
+    with os.scandir(target_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+
+            rel_path = os.path.join(rel_prefix, entry.name)
+
+            if entry.is_file():
+                stat = entry.stat()
+                files.append({
+                    "path": rel_path,
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime
+                })
+            elif entry.is_dir():
+                file_count, dir_count = _count_tree(entry.path)
+                subdirs.append({
+                    "path": rel_path,
+                    "file_count": file_count,
+                    "dir_count": dir_count
+                })
+
+    return files, subdirs
+
 async def list_files(directory: str = "") -> str:
     """
     List contents of a directory in the vault.
@@ -299,65 +469,34 @@ async def list_files(directory: str = "") -> str:
         target_dir = (vault_dir / clean_dir).resolve()
 
         # Ensure the target directory is still within the vault directory
-        try:
-            target_dir.relative_to(vault_dir)
-        except ValueError:
+        if not _is_within(target_dir, vault_dir):
             return f"Error: Invalid directory path '{directory}'."
 
         if not target_dir.exists() or not target_dir.is_dir():
             return f"Error: Directory '{directory}' not found in your vault."
 
-    files = []
-    subdirs = []
-
-    for item in target_dir.iterdir():
-        if _should_exclude_file(item, vault_dir):
-            continue
-
-        rel_path = item.relative_to(vault_dir)
-
-        if item.is_file():
-            stat = item.stat()
-            files.append({
-                "path": str(rel_path),
-                "size": stat.st_size,
-                "modified": datetime.fromtimestamp(stat.st_mtime).isoformat()
-            })
-        elif item.is_dir():
-            file_count = 0
-            dir_count = 0
-            for sub_item in item.rglob('*'):
-                if _should_exclude_file(sub_item, vault_dir):
-                    continue
-                if sub_item.is_file():
-                    file_count += 1
-                elif sub_item.is_dir():
-                    dir_count += 1
-
-            subdirs.append({
-                "path": str(rel_path),
-                "file_count": file_count,
-                "dir_count": dir_count
-            })
+    files, subdirs = await asyncio.to_thread(_scan_directory, target_dir, vault_dir)
 
     if not files and not subdirs:
         return f"No items found in '{directory or 'root'}'."
 
-    output = f"Contents of '{directory or 'root'}' in your vault:\n"
-    output += "Hint: Using the search_files feature instead is recommended when looking for a specific file.\n\n"
+    parts = [
+        f"Contents of '{directory or 'root'}' in your vault:\n",
+        "Hint: Using the search_files feature instead is recommended when looking for a specific file.\n\n"
+    ]
 
     if subdirs:
-        output += "Directories:\n"
+        parts.append("Directories:\n")
         for d in sorted(subdirs, key=lambda x: x['path']):
-            output += f"- [DIR] {d['path']} ({d['file_count']} files, {d['dir_count']} dirs)\n"
-        output += "\n"
+            parts.append(f"- [DIR] {d['path']} ({d['file_count']} files, {d['dir_count']} dirs)\n")
+        parts.append("\n")
 
     if files:
-        output += "Files:\n"
+        parts.append("Files:\n")
         for f in sorted(files, key=lambda x: x['path']):
-            output += f"- {f['path']}\n  Size: {f['size']} bytes\n  Modified: {f['modified']}\n\n"
+            parts.append(f"- {f['path']}\n  Size: {f['size']} bytes\n  Modified: {datetime.fromtimestamp(f['mtime']).isoformat()}\n\n")
 
-    return output
+    return "".join(parts)
 
 async def read_file(filename: str) -> str:
     """Read the contents of a vault file."""
@@ -370,8 +509,7 @@ async def read_file(filename: str) -> str:
     if not file_path.exists():
         return f"Error: File '{filename}' not found in your vault."
 
-    async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
-        return await f.read()
+    return await _read_text(file_path)
 
 async def modify_file(filename: str, content: str) -> str:
     """Update an existing vault file and trigger synchronization."""
@@ -384,12 +522,17 @@ async def modify_file(filename: str, content: str) -> str:
     if not file_path.exists():
         return f"Error: File '{filename}' not found. Use upload_file to create new files."
 
-    async with aiofiles.open(file_path, 'w', encoding='utf-8') as f:
-        await f.write(content)
+    # Skip the RAG delete/re-embed round trips and the Git commit when nothing changed
+    data = content.encode('utf-8')
+    if await asyncio.to_thread(_content_matches, file_path, data):
+        return f"No changes to '{filename}' ({len(data)} bytes)"
+
+    await _write_bytes(file_path, data)
 
-    await _index_in_rag_api(user_id, full_name, content, is_update=True)
-    await _trigger_git_commit(user_id, file_path)
-    return f"Successfully modified '{filename}' ({len(content)} bytes)"
+    await _index_in_rag_api(user_id, full_name, data, is_update=True)
+    invalidate_search_cache(user_id)
+    _schedule_git_commit(user_id, full_name[len(VAULT_FILE_PREFIX):])
+    return f"Successfully modified '{filename}' ({len(data)} bytes)"
 
 async def delete_file(filename: str) -> str:
     """Remove a file from the vault and the RAG index."""
@@ -402,21 +545,14 @@ async def delete_file(filename: str) -> str:
     if not file_path.exists():
         return f"Error: File '{filename}' not found in your vault."
 
-    file_id = get_file_id(user_id, full_name)
-    token = _generate_jwt_token(user_id)
-
-    headers = {"Accept": "application/json"}
-    if token:
-        headers["Authorization"] = f"Bearer {token}"
-
     try:
-        async with httpx.AsyncClient(timeout=NETWORK_TIMEOUT_SECONDS) as client:
-            await client.delete(f"{RAG_API_URL}/embed/{urllib.parse.quote(file_id, safe='')}", headers=headers)
+        await _remove_from_rag_api(user_id, full_name)
     except Exception as e:
         print(f"Warning: Failed to remove file from RAG API: {e}")
 
     file_path.unlink()
-    await _trigger_git_commit(user_id, file_path, is_delete=True)
+    invalidate_search_cache(user_id)
+    _schedule_git_commit(user_id, full_name[len(VAULT_FILE_PREFIX):], is_delete=True)
     return f"Successfully deleted '{filename}'"
 
 async def _get_query_embedding(query: str, user_id: str) -> list:
@@ -426,46 +562,50 @@ async def _get_query_embedding(query: str, user_id: str) -> list:
     if token:
         headers["Authorization"] = f"Bearer {token}"
 
-    async with httpx.AsyncClient(timeout=NETWORK_TIMEOUT_SECONDS) as client:
+    global _local_embed_retry_at
+    client = await _get_rag_client()
+    if time.monotonic() >= _local_embed_retry_at:
         try:
-            resp = await client.post(f"{RAG_API_URL}/local/embed", json={"text": query}, headers=headers)
+            resp = await client.post("/local/embed", json={"text": query}, headers=headers)
             if resp.status_code == 200:
                 data = resp.json()
                 return data["embedding"] if isinstance(data, dict) else data
+            if resp.status_code == 404:
+                _local_embed_retry_at = time.monotonic() + LOCAL_EMBED_RETRY_SECONDS
         except (httpx.HTTPStatusError, httpx.RequestError):
             pass
 
-        temp_id = f"temp_query_{user_id}_{int(datetime.now().timestamp())}"
-        files = {'file': ('query.txt', io.BytesIO(query.encode('utf-8')), 'text/plain')}
-        data = {'file_id': temp_id, 'storage_metadata': json.dumps({"user_id": user_id, "filename": "query.txt"})}
+    temp_id = f"temp_query_{user_id}_{int(time.time())}"
+    files = {'file': ('query.txt', query.encode('utf-8'), 'text/plain')}
+    data = {'file_id': temp_id, 'storage_metadata': json.dumps({"user_id": user_id, "filename": "query.txt"})}
 
-        multipart_headers = {k: v for k, v in headers.items() if k.lower() != 'content-type'}
-        await client.post(f"{RAG_API_URL}/embed", files=files, data=data, headers=multipart_headers)
+    multipart_headers = {k: v for k, v in headers.items() if k.lower() != 'content-type'}
+    await client.post("/embed", files=files, data=data, headers=multipart_headers)
 
-        conn = await asyncpg.connect(
-            host=VECTORDB_HOST,
-            port=VECTORDB_PORT,
-            database=VECTORDB_DB,
-            user=VECTORDB_USER,
-            password=VECTORDB_PASSWORD
+    conn = await asyncpg.connect(
+        host=VECTORDB_HOST,
+        port=VECTORDB_PORT,
+        database=VECTORDB_DB,
+        user=VECTORDB_USER,
+        password=VECTORDB_PASSWORD
+    )
+    try:
+        await register_vector(conn)
+        row = await conn.fetchrow(
+            "SELECT embedding FROM langchain_pg_embedding WHERE custom_id = $1 LIMIT 1",
+            temp_id
         )
-        try:
-            await register_vector(conn)
-            row = await conn.fetchrow(
-                "SELECT embedding FROM langchain_pg_embedding WHERE custom_id = $1 LIMIT 1",
-                temp_id
-            )
 
-            if not row or row.get('embedding') is None:
-                raise RuntimeError("Could not retrieve embedding from database")
+        if not row or row.get('embedding') is None:
+            raise RuntimeError("Could not retrieve embedding from database")
 
-            embedding = row['embedding']
-            result = embedding.tolist() if hasattr(embedding, 'tolist') else list(embedding)
+        embedding = row['embedding']
+        result = embedding.tolist() if hasattr(embedding, 'tolist') else list(embedding)
 
-            await conn.execute("DELETE FROM langchain_pg_embedding WHERE custom_id = $1", temp_id)
-            return result
-        finally:
-            await conn.close()
+        await conn.execute("DELETE FROM langchain_pg_embedding WHERE custom_id = $1", temp_id)
+        return result
+    finally:
+        await conn.close()
 
 async def _query_vectordb_direct(query_embedding: list, user_id: str, max_results: int = 5) -> List[Dict]:
     """Execute direct similarity search in pgvector database."""
@@ -504,10 +644,9 @@ async def _query_vectordb_direct(query_embedding: list, user_id: str, max_result
                 continue
 
             clean_name = name
-            vault_prefix = "obsidian_vault/"
 
-            if clean_name.startswith(vault_prefix):
-                clean_name = clean_name[len(vault_prefix):]
+            if clean_name.startswith(VAULT_FILE_PREFIX):
+                clean_name = clean_name[len(VAULT_FILE_PREFIX):]
                 if not _should_exclude_file(vault_dir / clean_name, vault_dir):
                     results.append({
                         "content": row['document'] or "",
@@ -538,21 +677,80 @@ async def _query_vectordb_direct(query_embedding: list, user_id: str, max_result
     finally:
         await conn.close()
 
+def _normalize_embedding(embedding: list) -> np.ndarray:
+    """Return the embedding as an L2-normalized vector so a dot product is the cosine similarity."""
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def _lookup_search_cache(user_id: str, vector: np.ndarray, max_results: int) -> Optional[List[Dict]]:
+    """Return cached matches for a near-identical earlier query, or None on a miss."""
+    entries = _search_cache.get(user_id)
+    if not entries:
+        return None
+
+    now = time.monotonic()
+    entries[:] = [entry for entry in entries if entry[3] > now]
+    candidates = [i for i, entry in enumerate(entries) if entry[1] >= max_results and entry[0].shape == vector.shape]
+    if not candidates:
+        return None
+
+    scores = np.stack([entries[i][0] for i in candidates]) @ vector
+    best = int(np.argmax(scores))
+    if scores[best] < SEARCH_CACHE_SIMILARITY:
+        return None
+
+    # Move the hit to the end so the least recently used entry is evicted first
+    entry = entries.pop(candidates[best])
+    entries.append(entry)
+    return entry[2][:max_results]
+
+def _store_search_cache(user_id: str, vector: np.ndarray, max_results: int, matches: List[Dict],
+                        fingerprint: Optional[Tuple[int, int]]) -> None:
+    """Remember search results for a query embedding, evicting the oldest entry when full."""
+    _search_cache_fingerprints[user_id] = fingerprint
+    entries = _search_cache.setdefault(user_id, [])
+    entries.append((vector, max_results, matches, time.monotonic() + SEARCH_CACHE_TTL_SECONDS))
+    if len(entries) > SEARCH_CACHE_SIZE:
+        entries.pop(0)
+
+def invalidate_search_cache(user_id: str) -> None:
+    """Drop cached search results after the user's vault content changes."""
+    _search_cache.pop(user_id, None)
+    _search_cache_fingerprints.pop(user_id, None)
+    _search_cache_generations[user_id] = _search_cache_generations.get(user_id, 0) + 1
+
+def _index_fingerprint(user_id: str) -> Optional[Tuple[int, int]]:
+    """Return (mtime_ns, size) of the Worker's hash database, or None if it does not exist."""
+    try:
+        st = (get_user_storage_path(user_id) / "sync_hashes.json").stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
 async def search_files(query: str, max_results: int = 5) -> str:
     """Perform semantic search across all files in the Obsidian vault."""
     user_id = get_current_user()
     try:
         embedding = await _get_query_embedding(query, user_id)
-        matches = await _query_vectordb_direct(embedding, user_id, max_results)
+        vector = _normalize_embedding(embedding)
+        fingerprint = await asyncio.to_thread(_index_fingerprint, user_id)
+        if _search_cache_fingerprints.get(user_id) != fingerprint:
+            invalidate_search_cache(user_id)
+        matches = _lookup_search_cache(user_id, vector, max_results)
+        if matches is None:
+            generation = _search_cache_generations.get(user_id, 0)
+            matches = await _query_vectordb_direct(embedding, user_id, max_results)
+            if _search_cache_generations.get(user_id, 0) == generation:
+                _store_search_cache(user_id, vector, max_results, matches, fingerprint)
     except Exception as e:
         raise RuntimeError(f"Failed to search files: {e}")
 
     if not matches:
         return f"No results found for query: '{query}'"
 
-    output = f"Found {len(matches)} result(s) for '{query}':\n\n"
+    parts = [f"Found {len(matches)} result(s) for '{query}':\n\n"]
     for i, match in enumerate(matches, 1):
         excerpt = match["content"][:SEARCH_EXCERPT_LENGTH]
-        output += f"{i}. {match['filename']} (relevance: {match['relevance']:.3f})\n"
-        output += f"   {excerpt}...\n\n"
-    return output
+        parts.append(f"{i}. {match['filename']} (relevance: {match['relevance']:.3f})\n   {excerpt}...\n\n")
+    return "".join(parts)
@@ -6,19 +6,20 @@ All operations are scoped to the authenticated user.
 """
 
 import json
-import aiofiles
+import asyncio
 import os
 import sys
 import re
-import subprocess
-import logging
+import time
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, Dict, Tuple, List
 
 # Ensure parent directory is in path for relative imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from shared.storage import get_current_user, get_user_storage_path, get_obsidian_headers, get_user_vault_path
+from shared.git_credentials import clean_remote_url, setup_credential_store, get_token_from_store
+from tools.file_storage import invalidate_git_config, invalidate_search_cache
 
 # Time and Sync Constants
 SECONDS_PER_MINUTE = 60
@@ -27,84 +28,53 @@ HOURS_PER_DAY = 24
 MAX_CONSECUTIVE_FAILURES = 5
 VERSION_TAG = "1.1"
 
-def clean_remote_url(url: str) -> str:
-    """Remove authentication tokens from a Git remote URL."""
-    if not url:
-        return url
-    return re.sub(r'^(https?://)[^@/]+@', r'\1', url)
+# Worker cycle settings used for ETA estimates (shared with the Worker's environment)
+FILES_PER_CYCLE = int(os.environ.get("MAX_FILES_PER_CYCLE", "10"))
+SYNC_INTERVAL_SECONDS = int(os.environ.get("SYNC_INTERVAL", "60"))
 
-def setup_credential_store(user_id: str, repo_url: str, token: str) -> None:
-    """Save the user's token into the persistent Git credential store."""
-    user_storage = get_user_storage_path(user_id)
-    cred_file = user_storage / ".git-credentials"
-    cred_file.parent.mkdir(parents=True, exist_ok=True)
-
-    if not token:
-        return
-
-    url_match = re.match(r'^(https?://)([^/]+)(/.*)?$', repo_url)
-    if not url_match:
-        return
-
-    protocol, host_part, path = url_match.groups()
-    host = host_part.split("@")[-1]
-    path = path or "/"
-
-    credential_input = f"protocol={protocol.rstrip('://')}\nhost={host}\npath={path}\nusername={token}\npassword=\n\n"
-
-    try:
-        subprocess.run(
-            ["git", "-c", f"credential.helper=store --file={cred_file}", "credential", "approve"],
-            input=credential_input.encode("utf-8"),
-            check=True,
-            capture_output=True
-        )
-    except subprocess.CalledProcessError as e:
-        logging.getLogger(__name__).warning(f"Failed to store credentials for user {user_id}: {e}")
-
-def get_token_from_store(user_id: str, repo_url: str) -> Optional[str]:
-    """Retrieve the token for a repository from the persistent Git store."""
-    user_storage = get_user_storage_path(user_id)
-    cred_file = user_storage / ".git-credentials"
-    if not cred_file.exists():
-        return None
-
-    url_match = re.match(r'^(https?://)([^/]+)(/.*)?$', repo_url)
-    if not url_match:
-        return None
-
-    protocol, host_part, path = url_match.groups()
-    host = host_part.split("@")[-1]
-    path = path or "/"
-
-    credential_request = f"protocol={protocol.rstrip('://')}\nhost={host}\npath={path}\n"
-
-    try:
-        result = subprocess.run(
-            ["git", "-c", f"credential.helper=store --file={cred_file}", "credential", "fill"],
-            input=credential_request.encode("utf-8"),
-            check=True,
-            capture_output=True
-        )
-        for line in result.stdout.decode("utf-8").splitlines():
-            if line.startswith("username="):
-                return line.split("=", 1)[1]
-    except subprocess.CalledProcessError:
-        return None
-    return None
+# Vault stats keyed by vault path: ((vault mtime, hash DB mtime, hash DB size), expiry, (total, synced))
+VAULT_STATS_CACHE_TTL_SECONDS = 5.0
+_vault_stats_cache: Dict[Path, Tuple[Tuple[int, int, int], float, Tuple[int, int]]] = {}
 
 def _is_unreplaced_placeholder(value: str) -> bool:
     """Check if a string is an unreplaced LibreChat placeholder."""
-    return bool(value and value.startswith("{{") and value.endswith("}}"))
+    return bool(value) and value[:2] == "{{" and value[-2:] == "}}"
 
 def _validate_config_values(repo_url: str, token: str, branch: str) -> None:
     """Ensure configuration values are not unreplaced placeholders."""
-    if any(_is_unreplaced_placeholder(v) for v in [repo_url, token, branch]):
+    if _is_unreplaced_placeholder(repo_url) or _is_unreplaced_placeholder(token) or _is_unreplaced_placeholder(branch):
         raise ValueError(
             "Invalid configuration: LibreChat did not replace placeholder values. "
             "Please ensure customUserVars are properly set in LibreChat UI settings."
         )
 
+def _utc_iso() -> str:
+    """Current UTC time as an ISO 8601 string with second precision."""
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+def _read_json(path: Path) -> Dict:
+    """Read a small JSON file synchronously; cheaper than a threadpool hop for sub-page configs."""
+    return json.loads(path.read_bytes())
+
+def _write_config(config_path: Path, config: Dict) -> None:
+    """Durably replace a JSON config file: write a temp file, fsync it, rename, then fsync the directory."""
+    temp_path = config_path.with_suffix(".tmp")
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(config, separators=(',', ':')))
+            f.flush()
+            os.fsync(f.fileno())
+        temp_path.replace(config_path)
+    except Exception:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    dir_fd = os.open(config_path.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
 async def auto_configure_obsidian_sync(user_id: str, repo_url: str, token: str, branch: str = "main") -> None:
     """Initialize synchronization configuration from provided credentials."""
     _validate_config_values(repo_url, token, branch)
@@ -115,7 +85,7 @@ async def auto_configure_obsidian_sync(user_id: str, repo_url: str, token: str,
     config = {
         "repo_url": clean_remote_url(repo_url),
         "branch": branch,
-        "updated_at": datetime.utcnow().isoformat(),
+        "updated_at": _utc_iso(),
         "auto_configured": True,
         "version": VERSION_TAG,
         "failure_count": 0,
@@ -124,18 +94,18 @@ async def auto_configure_obsidian_sync(user_id: str, repo_url: str, token: str,
 
     setup_credential_store(user_id, repo_url, token)
 
-    temp_path = config_path.with_suffix(".tmp")
     try:
-        async with aiofiles.open(temp_path, 'w', encoding='utf-8') as f:
-            await f.write(json.dumps(config, indent=2))
-        temp_path.replace(config_path)
+        await asyncio.to_thread(_write_config, config_path, config)
+        invalidate_git_config(user_id)
     except Exception as e:
-        if temp_path.exists():
-            temp_path.unlink()
         raise RuntimeError(f"Failed to save sync configuration: {e}")
 
 async def configure_obsidian_sync(repo_url: Optional[str] = None, token: Optional[str] = None, branch: str = "main") -> str:
-    """Manual tool to configure or update Git Sync for the Obsidian Vault."""
+    """Manual tool to configure or update Git Sync for the Obsidian Vault.
+
+    Provide only a token to rotate it for the configured repository, or only a repo_url
+    to switch repositories using a token already stored for that host.
+    """
     user_id = get_current_user()
     user_dir = get_user_storage_path(user_id)
     config_path = user_dir / "git_config.json"
@@ -144,63 +114,104 @@ async def configure_obsidian_sync(repo_url: Optional[str] = None, token: Optiona
         if not config_path.exists():
             return "No Obsidian sync configuration found. Please provide repo_url and token."
 
-        async with aiofiles.open(config_path, 'r', encoding='utf-8') as f:
-            config = json.loads(await f.read())
-
-        status = "stopped" if config.get("stopped") else "active"
-        return f"Current sync status: {status}. Repository: {config.get('repo_url')}"
+        config = _read_json(config_path)
+
+        if token:
+            # Token rotation: keep the configured repository and branch, store the new token
+            _validate_config_values(config.get('repo_url', ''), token, config.get('branch', 'main'))
+            setup_credential_store(user_id, config['repo_url'], token)
+            config.update({"failure_count": 0, "stopped": False, "updated_at": _utc_iso()})
+            await asyncio.to_thread(_write_config, config_path, config)
+            invalidate_git_config(user_id)
+            return f"Successfully updated the token for: {config['repo_url']}"
+
+        if repo_url:
+            # Repository change: reuse the stored token for that host if there is one
+            token = get_token_from_store(user_id, repo_url)
+            if not token:
+                return f"No stored token found for {repo_url}. Please provide a token."
+        else:
+            status = "stopped" if config.get("stopped") else "active"
+            return f"Current sync status: {status}. Repository: {config.get('repo_url')}"
 
     _validate_config_values(repo_url, token, branch)
     await auto_configure_obsidian_sync(user_id, repo_url, token, branch)
     return f"Successfully configured Obsidian Sync for: {repo_url}"
 
 def _get_vault_stats(vault_path: Path, hash_db_path: Path) -> Tuple[int, int]:
-    """Calculate total markdown files and currently synced files."""
-    if not vault_path.exists():
-        return 0, 0
+    """Calculate total markdown files and currently synced files.
 
-    total_md_files = 0
-    for root, dirs, files in os.walk(vault_path):
-        dirs[:] = [d for d in dirs if not d.startswith('.')]
-        if any(part.startswith('.') for part in Path(root).parts):
-            continue
-        total_md_files += sum(1 for f in files if f.endswith('.md'))
+    Results are reused for VAULT_STATS_CACHE_TTL_SECONDS while the vault root and the
+    hash database are unchanged, since status is polled far more often than notes change.
+    """
+    try:
+        vault_stat = vault_path.stat()
+    except FileNotFoundError:
+        return 0, 0
+    try:
+        hash_stat = hash_db_path.stat()
+        key = (vault_stat.st_mtime_ns, hash_stat.st_mtime_ns, hash_stat.st_size)
+    except FileNotFoundError:
+        key = (vault_stat.st_mtime_ns, 0, 0)
+
+    cached = _vault_stats_cache.get(vault_path)
+    if cached and cached[0] == key and cached[1] > time.monotonic():
+        return cached[2]
+
+    stats = _compute_vault_stats(vault_path, hash_db_path)
+    _vault_stats_cache[vault_path] = (key, time.monotonic() + VAULT_STATS_CACHE_TTL_SECONDS, stats)
+    return stats
+
+def _compute_vault_stats(vault_path: Path, hash_db_path: Path) -> Tuple[int, int]:
+    """Walk the vault and hash database to count markdown files and synced files."""
+    # Hidden directories are pruned before descending, so no per-directory path check is needed.
+    # The Worker keys the hash database by vault-relative POSIX path, so paths are collected
+    # in that form and synced entries are matched by plain set membership.
+    vault_prefix = str(vault_path) + os.sep
+    prefix_len = len(vault_prefix)
+    md_paths = set()
+    stack = [str(vault_path)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif name.endswith('.md'):
+                    md_paths.add(entry.path[prefix_len:].replace(os.sep, '/'))
 
     synced_count = 0
-    if hash_db_path.exists():
+    if md_paths and hash_db_path.exists():
         try:
             with open(hash_db_path, 'r', encoding='utf-8') as f:
-                hashes = json.loads(f.read())
-            for path_str in hashes.keys():
-                path = Path(path_str)
-                if path.exists() and path.suffix == '.md':
-                    try:
-                        path.relative_to(vault_path)
+                for path_str in json.load(f):
+                    # Entries written before relative keys were absolute vault paths
+                    if path_str.startswith(vault_prefix):
+                        path_str = path_str[prefix_len:].replace(os.sep, '/')
+                    if path_str in md_paths:
                         synced_count += 1
-                    except ValueError:
-                        pass
         except Exception:
             pass
 
-    return total_md_files, synced_count
+    return len(md_paths), synced_count
 
 def _calculate_eta(remaining_files: int) -> Optional[str]:
     """Estimate remaining sync time based on worker cycle limits."""
     if remaining_files <= 0:
         return None
 
-    files_per_cycle = int(os.environ.get("MAX_FILES_PER_CYCLE", "10"))
-    interval_seconds = int(os.environ.get("SYNC_INTERVAL", "60"))
-
-    cycles_needed = (remaining_files + files_per_cycle - 1) // files_per_cycle
-    total_minutes = int(round(cycles_needed * (interval_seconds / SECONDS_PER_MINUTE)))
+    # Integer arithmetic throughout, rounding half a minute up
+    cycles_needed = -(-remaining_files // FILES_PER_CYCLE)
+    total_seconds = cycles_needed * SYNC_INTERVAL_SECONDS
+    total_minutes = (total_seconds + SECONDS_PER_MINUTE // 2) // SECONDS_PER_MINUTE
 
     if total_minutes <= 0:
         return "less than 1 minute"
 
-    days = total_minutes // (HOURS_PER_DAY * MINUTES_PER_HOUR)
-    hours = (total_minutes % (HOURS_PER_DAY * MINUTES_PER_HOUR)) // MINUTES_PER_HOUR
-    minutes = total_minutes % MINUTES_PER_HOUR
+    days, rest = divmod(total_minutes, HOURS_PER_DAY * MINUTES_PER_HOUR)
+    hours, minutes = divmod(rest, MINUTES_PER_HOUR)
 
     parts = []
     if days: parts.append(f"{days} day{'s' if days != 1 else ''}")
@@ -219,22 +230,31 @@ async def get_obsidian_sync_status() -> str:
 
     if not config_path.exists():
         repo_url, token, branch = get_obsidian_headers()
-        if repo_url and token and not any(_is_unreplaced_placeholder(v) for v in [repo_url, token]):
+        if repo_url and token and not (_is_unreplaced_placeholder(repo_url) or _is_unreplaced_placeholder(token)):
             await auto_configure_obsidian_sync(user_id, repo_url, token, branch or "main")
             return "✅ Configuration initialized from UI settings. Sync is now active."
         return "No Obsidian sync configuration found."
 
-    async with aiofiles.open(config_path, 'r', encoding='utf-8') as f:
-        config = json.loads(await f.read())
+    config = _read_json(config_path)
 
     repo = config.get('repo_url', 'unknown')
     if _is_unreplaced_placeholder(repo):
         return "⚠️ CONFIGURATION ERROR: Placeholders detected. Please update your UI settings."
 
-    total, synced = _get_vault_stats(get_user_vault_path(user_id), user_dir / "sync_hashes.json")
+    hash_db_path = user_dir / "sync_hashes.json"
+    # Without a hash database nothing has been indexed yet, so the vault walk can be skipped
+    indexing_started = hash_db_path.exists()
+    if indexing_started:
+        total, synced = await asyncio.to_thread(_get_vault_stats, get_user_vault_path(user_id), hash_db_path)
+    else:
+        total, synced = 0, 0
     percentage = (synced / total * 100) if total > 0 else 0
     eta = _calculate_eta(total - synced)
 
+    failure_count = config.get('failure_count', 0)
+    last_failure_error = config.get('last_failure_error')
+    last_success = config.get('last_success')
+
     lines = [
         "=== Obsidian Sync Status ===",
         f"Repository: {repo}",
@@ -247,18 +267,21 @@ async def get_obsidian_sync_status() -> str:
         lines.append(f"**Progress:** {synced}/{total} files ({percentage:.1f}%)")
         if eta: lines.append(f"**Estimated completion:** {eta}")
         lines.append("")
+    elif not indexing_started:
+        lines.append("**Progress:** Waiting for initial indexing")
+        lines.append("")
 
     if config.get('stopped'):
-        lines.append(f"❌ **STOPPED** - Failed {config.get('failure_count')} times.")
-        if config.get('last_failure_error'):
-            lines.append(f"Error: {config.get('last_failure_error')}")
-    elif config.get('failure_count', 0) > 0:
-        lines.append(f"⚠️ **WARNING:** {config.get('failure_count')} recent failures.")
+        lines.append(f"❌ **STOPPED** - Failed {failure_count} times.")
+        if last_failure_error:
+            lines.append(f"Error: {last_failure_error}")
+    elif failure_count > 0:
+        lines.append(f"⚠️ **WARNING:** {failure_count} recent failures.")
     else:
         lines.append("✅ **ACTIVE**")
 
-    if config.get('last_success'):
-        lines.append(f"Last success: {config.get('last_success')}")
+    if last_success:
+        lines.append(f"Last success: {last_success}")
 
     return "\n".join(lines)
 
@@ -271,19 +294,18 @@ async def reset_obsidian_sync_failures() -> str:
     if not config_path.exists():
         return "No configuration found to reset."
 
-    async with aiofiles.open(config_path, 'r', encoding='utf-8') as f:
-        config = json.loads(await f.read())
+    config = _read_json(config_path)
 
     config.update({
         "failure_count": 0,
         "stopped": False,
-        "updated_at": datetime.utcnow().isoformat()
+        "updated_at": _utc_iso()
     })
     config.pop('last_failure', None)
     config.pop('last_failure_error', None)
 
-    async with aiofiles.open(config_path, 'w', encoding='utf-8') as f:
-        await f.write(json.dumps(config, indent=2))
+    await asyncio.to_thread(_write_config, config_path, config)
+    invalidate_git_config(user_id)
 
     return "Successfully reset sync failure count. Sync will resume on the next cycle."
 
@@ -293,7 +315,17 @@ async def force_complete_reindex() -> str:
     user_dir = get_user_storage_path(user_id)
     hash_db = user_dir / "sync_hashes.json"
 
-    if hash_db.exists():
+    # The Worker's stat fingerprints are only trusted for files still in the hash database,
+    # but drop them too so no stale entries linger. Forgetting the processed HEADs keeps the
+    # Worker from treating an unchanged vault as up to date.
+    invalidate_search_cache(user_id)
+    for state_file in ("sync_meta.json", "indexed_head", "hidden_cleanup_head"):
+        try:
+            (user_dir / state_file).unlink()
+        except FileNotFoundError:
+            pass
+    try:
         hash_db.unlink()
-        return "✅ Full reindex scheduled. All files will be refreshed on the next sync cycle."
-    return "✅ Full reindex scheduled. No existing index was found."
+    except FileNotFoundError:
+        return "✅ Full reindex scheduled. No existing index was found."
+    return "✅ Full reindex scheduled. All files will be refreshed on the next sync cycle."
@@ -0,0 +1,39 @@
+"""
+Shared pytest setup for Worker tests.
+"""
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock
+
+WORKER_DIR = Path(__file__).resolve().parent.parent
+
+
+def _prefer_worker_main():
+    """Make 'from main import ...' resolve to Worker/main.py.
+
+    McpService also has a main.py and puts its own directory first on sys.path, so when
+    both suites run in one session the Worker directory is moved back to the front and
+    any other 'main' already imported is forgotten.
+    """
+    if str(WORKER_DIR) in sys.path:
+        sys.path.remove(str(WORKER_DIR))
+    sys.path.insert(0, str(WORKER_DIR))
+
+    loaded = sys.modules.get("main")
+    if loaded is not None and Path(getattr(loaded, "__file__", None) or ".").resolve() != WORKER_DIR / "main.py":
+        del sys.modules["main"]
+
+
+def pytest_collectstart(collector):
+    """Re-check the import path before each Worker test module is imported."""
+    _prefer_worker_main()
+
+
+_prefer_worker_main()
+
+# Stub GitPython only where it is not installed, so other suites collected in the same
+# session keep the real package; the tests patch main.Repo where they touch Git
+try:
+    import git  # noqa: F401
+except ImportError:
+    sys.modules["git"] = MagicMock()
@@ -1,20 +1,11 @@
+import io
 import os
 import json
+import hashlib
+import tempfile
 import unittest
-from unittest.mock import MagicMock, patch, mock_open
+from unittest.mock import MagicMock, patch
 from pathlib import Path
-import sys
-from unittest.mock import MagicMock
-
-# Mock git module before importing main
-sys.modules["git"] = MagicMock()
-import sys
-from pathlib import Path
-
-# Add Worker directory to path
-WORKER_DIR = Path(__file__).parent.parent
-if str(WORKER_DIR) not in sys.path:
-    sys.path.insert(0, str(WORKER_DIR))
 
 from main import GitSync, SyncManager, IndexingManager
 
@@ -57,38 +48,415 @@ class TestGitSync(unittest.TestCase):
              mock_repo.assert_called()
              mock_setup_creds.assert_called()
 
-class TestSyncManager(unittest.TestCase):
-    @patch("main.STORAGE_ROOT")
-    @patch("main.GitSync")
-    def test_run_discovers_users(self, mock_git_sync, mock_storage_root):
-        """Test that the manager finds users with valid config."""
+class TestIndexingManager(unittest.TestCase):
+    def setUp(self):
+        self.indexer = IndexingManager("testuser", Path("/vault"))
+
+    def tearDown(self):
+        import main
+        main._rag_client = None
+        main._jwt_cache.clear()
+
+    @patch("main.RAG_HTTP2", True)
+    @patch("main.importlib.util.find_spec", return_value=None)
+    @patch("main.httpx.Client")
+    def test_http2_falls_back_without_h2(self, mock_client_cls, mock_find_spec):
+        """Test that enabling HTTP/2 without the h2 package keeps HTTP/1.1."""
+        from main import _get_rag_client
+        _get_rag_client()
+        self.assertFalse(mock_client_cls.call_args.kwargs["http2"])
+
+    @patch("main.RAG_API_JWT_SECRET", "secret")
+    @patch("main.jwt.encode", return_value="token")
+    def test_jwt_token_reused_until_near_expiry(self, mock_encode):
+        """Test that JWTs are cached per user across indexer instances."""
+        with patch("main.time.time", return_value=1000.0):
+            self.assertEqual(self.indexer._generate_jwt_token(), "token")
+            self.assertEqual(IndexingManager("testuser", Path("/vault"))._generate_jwt_token(), "token")
+        self.assertEqual(mock_encode.call_count, 1)
+
+        with patch("main.time.time", return_value=1000.0 + 290):
+            self.indexer._generate_jwt_token()
+        self.assertEqual(mock_encode.call_count, 2)
+
+    @patch("main.httpx.Client")
+    def test_requests_share_pooled_client(self, mock_client_cls):
+        """Test that stale-cleanup and upload requests reuse one pooled client."""
+        mock_client = mock_client_cls.return_value
+        mock_client.is_closed = False
+
+        self.indexer._clear_stale_embeddings("user_testuser_a b.md", {})
+        self.indexer._upload_embeddings("user_testuser_a b.md", "a b.md", io.BytesIO(b"content"), {})
+
+        mock_client_cls.assert_called_once()
+        mock_client.delete.assert_called_once_with("/embed/user_testuser_a%20b.md", headers={})
+        self.assertEqual(mock_client.post.call_args.args[0], "/embed")
+
+    @patch("main.httpx.Client")
+    def test_concurrent_first_use_creates_one_client(self, mock_client_cls):
+        """Test that user threads racing on first use share a single client."""
+        import threading
+        import time
+        from main import _get_rag_client
+
+        def slow_client(**kwargs):
+            time.sleep(0.01)
+            return MagicMock(is_closed=False)
+
+        mock_client_cls.side_effect = slow_client
+        barrier = threading.Barrier(8)
+        clients = []
+
+        def worker():
+            barrier.wait()
+            clients.append(_get_rag_client())
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        mock_client_cls.assert_called_once()
+        self.assertEqual(len({id(client) for client in clients}), 1)
+
+class TestHashDatabase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.patcher = patch("main.STORAGE_ROOT", self.root)
+        self.patcher.start()
+        self.sync = GitSync("testuser", {"repo_url": "https://github.com/user/repo"})
+        self.sync.vault_path.mkdir(parents=True)
+        self.note = self.sync.vault_path / "note.md"
+        self.note.write_text("hello")
+        # Databases written before fingerprints existed hold MD5 digests under absolute paths
+        legacy = {str(self.note): hashlib.md5(b"hello").hexdigest()}
+        (self.root / "testuser" / "sync_hashes.json").write_text(json.dumps(legacy))
+
+    def tearDown(self):
+        import main
+        main._hash_db_cache.clear()
+        self.patcher.stop()
+        self.tmp.cleanup()
+
+    def test_hash_db_kept_in_memory_until_file_changes(self):
+        """Test that an unchanged hash database is not parsed again on the next cycle."""
+        self.sync._load_hash_db()
+        self.sync._has_changed(self.note, self.note.stat())
+        self.sync._save_hash_db()
+
+        with patch("main._read_json_dict") as mock_read:
+            self.sync._load_hash_db()
+        mock_read.assert_not_called()
+        self.assertIn("note.md", self.sync._hashes)
+
+        # An external reset, such as a reindex, is picked up
+        (self.root / "testuser" / "sync_hashes.json").unlink()
+        self.sync._load_hash_db()
+        self.assertEqual(self.sync._hashes, {})
+
+    def test_legacy_md5_entry_is_migrated_without_reindexing(self):
+        """Test that a matching legacy entry counts as unchanged and is rewritten once."""
+        self.sync._load_hash_db()
+        self.assertFalse(self.sync._has_changed(self.note, self.note.stat()))
+        self.sync._save_hash_db()
+
+        hashes = json.loads((self.root / "testuser" / "sync_hashes.json").read_text())
+        self.assertEqual(list(hashes), ["note.md"])
+        meta = json.loads((self.root / "testuser" / "sync_meta.json").read_text())
+        self.assertEqual(meta["note.md"], [self.note.stat().st_size, self.note.stat().st_mtime_ns])
+
+    def test_fingerprint_match_skips_reading_file(self):
+        """Test that files with an unchanged size and mtime are not read."""
+        self.sync._load_hash_db()
+        self.sync._has_changed(self.note, self.note.stat())
+
+        with patch("main._file_digest") as mock_digest:
+            self.assertFalse(self.sync._has_changed(self.note, self.note.stat()))
+        mock_digest.assert_not_called()
+
+    def test_modified_file_is_detected(self):
+        """Test that changed content is reported once the fingerprint differs."""
+        self.sync._load_hash_db()
+        self.note.write_text("hello, world")
+        self.assertTrue(self.sync._has_changed(self.note, self.note.stat()))
+
+    def test_modified_file_digest_is_reused_after_indexing(self):
+        """Test that a modified file is hashed once for detection and not again when recorded."""
+        self.sync._load_hash_db()
+        self.note.write_text("hello, world")
+        self.assertTrue(self.sync._has_changed(self.note, self.note.stat()))
+
+        with patch("main._file_digest") as mock_digest:
+            self.sync._update_hash(self.note)
+        mock_digest.assert_not_called()
+        self.assertFalse(self.sync._has_changed(self.note, self.note.stat()))
+
+    @patch("main.INDEX_DELAY", 0)
+    def test_indexing_queue_records_only_successful_uploads(self):
+        """Test that concurrent indexing records hashes for successful files only."""
+        other = self.sync.vault_path / "other.md"
+        other.write_text("other")
+        self.sync._load_hash_db()
+
+        with patch.object(self.sync.indexer, "index_file", side_effect=lambda path: path == self.note):
+            self.sync._process_indexing_queue([self.note, other])
+
+        self.assertIn("note.md", self.sync._hashes)
+        self.assertNotIn("other.md", self.sync._hashes)
+
+class TestTokenBucket(unittest.TestCase):
+    @patch("main.time.sleep")
+    @patch("main.time.monotonic")
+    def test_bursts_then_waits_only_for_residual(self, mock_monotonic, mock_sleep):
+        """Test that the bucket admits a burst immediately and then sleeps just long enough."""
+        from main import TokenBucket
+        clock = [100.0]
+        mock_monotonic.side_effect = lambda: clock[0]
+        mock_sleep.side_effect = lambda seconds: clock.__setitem__(0, clock[0] + seconds)
+
+        bucket = TokenBucket(rate=2, capacity=2)
+        bucket.acquire()
+        bucket.acquire()
+        mock_sleep.assert_not_called()
+
+        clock[0] += 0.25
+        bucket.acquire()
+        mock_sleep.assert_called_once_with(0.25)
 
-        # Setup mock directory structure
-        mock_user_dir = MagicMock()
-        mock_user_dir.is_dir.return_value = True
-        mock_user_dir.name = "testuser_1"
+class TestFileDiscovery(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.patcher = patch("main.STORAGE_ROOT", Path(self.tmp.name))
+        self.patcher.start()
+        self.sync = GitSync("testuser", {"repo_url": "https://github.com/user/repo"})
+        self.sync.vault_path.mkdir(parents=True)
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.tmp.cleanup()
+
+    def test_ls_files_skips_hidden_and_deleted_paths(self):
+        """Test that hidden paths are filtered and deleted tracked files never reach indexing."""
+        (self.sync.vault_path / "kept.md").write_text("a")
+        repo = MagicMock()
+        repo.git.ls_files.return_value = "kept.md\0.obsidian/a.md\0notes/.trash/b.md\0deleted.md\0"
+
+        md_files = self.sync._get_eligible_markdown_files(repo)
+        self.assertEqual(md_files, [self.sync.vault_path / "kept.md", self.sync.vault_path / "deleted.md"])
+
+        with patch.object(self.sync, "_process_indexing_queue") as mock_queue:
+            self.sync._index_vault_files(repo, "")
+        mock_queue.assert_called_once_with([self.sync.vault_path / "kept.md"])
+
+    def test_directory_scans_split_visible_and_hidden_files(self):
+        """Test that the fallback scan prunes hidden directories and the hidden finder covers them."""
+        vault = self.sync.vault_path
+        (vault / "notes" / ".trash").mkdir(parents=True)
+        (vault / "notes" / "visible.md").write_text("a")
+        (vault / "notes" / ".hidden.md").write_text("b")
+        (vault / "notes" / ".trash" / "old.md").write_text("c")
+
+        self.assertEqual(self.sync._fallback_get_markdown_files(), [vault / "notes" / "visible.md"])
+        self.assertEqual(
+            self.sync.indexer._find_hidden_markdown_files(),
+            [("user_testuser_old.md", str(vault / "notes" / ".trash" / "old.md"))]
+        )
+
+    @patch("main.INDEX_DELAY", 0)
+    def test_clean_cycles_only_index_files_changed_since_indexed_head(self):
+        """Test that after a complete run only files from git diff are considered."""
+        vault = self.sync.vault_path
+        (vault / "a.md").write_text("a")
+        repo = MagicMock()
+        repo.head.commit.hexsha = "h1"
+        repo.git.status.return_value = ""
+        repo.git.ls_files.return_value = "a.md\0"
+
+        with patch.object(self.sync.indexer, "index_file", return_value=True) as mock_index:
+            self.sync._index_vault_files(repo, "")
+            self.sync._index_vault_files(repo, "")
+            self.assertEqual(mock_index.call_count, 1)
+
+            (vault / "b.md").write_text("b")
+            repo.head.commit.hexsha = "h2"
+            repo.git.diff.return_value = "b.md\0"
+            self.sync._index_vault_files(repo, "")
+
+        repo.git.ls_files.assert_called_once()
+        repo.git.diff.assert_called_once_with("--name-only", "-z", "h1", "h2", "--", "*.md")
+        self.assertEqual(mock_index.call_args.args[0], vault / "b.md")
+        self.assertEqual((Path(self.tmp.name) / "testuser" / "indexed_head").read_text(), "h2")
+
+    def test_hidden_cleanup_runs_only_when_head_moves(self):
+        """Test that the hidden-directory cleanup is skipped until HEAD changes."""
+        repo = MagicMock()
+        repo.head.commit.hexsha = "aaa"
+
+        with patch.object(self.sync.indexer, "cleanup_hidden_directory_files", return_value=True) as mock_cleanup:
+            self.sync._cleanup_hidden_files_if_head_moved(repo)
+            self.sync._cleanup_hidden_files_if_head_moved(repo)
+            self.assertEqual(mock_cleanup.call_count, 1)
+
+            repo.head.commit.hexsha = "bbb"
+            self.sync._cleanup_hidden_files_if_head_moved(repo)
+            self.assertEqual(mock_cleanup.call_count, 2)
+
+    def test_sync_stops_after_pull_when_up_to_date(self):
+        """Test that a clean vault at the processed HEAD skips cleanup, indexing and push."""
+        repo = MagicMock()
+        repo.head.commit.hexsha = "aaa"
+        repo.git.status.return_value = ""
+        user_dir = Path(self.tmp.name) / "testuser"
+        (user_dir / "indexed_head").write_text("aaa")
+        (user_dir / "hidden_cleanup_head").write_text("aaa")
+        (user_dir / "sync_hashes.json").write_text('{"a.md": "digest"}')
+
+        with patch.object(self.sync, "_ensure_repo", return_value=repo), \
+                patch.object(self.sync, "_index_vault_files") as mock_index, \
+                patch.object(self.sync, "_push_local_changes") as mock_push:
+            self.sync.sync()
+            mock_index.assert_not_called()
+            mock_push.assert_not_called()
+
+            repo.git.status.return_value = " M a.md"
+            self.sync.sync()
+            mock_index.assert_called_once_with(repo, " M a.md")
+            mock_push.assert_called_once_with(repo, " M a.md")
+        repo.remotes.origin.pull.assert_called_with(self.sync.branch)
+
+    @patch("main.INDEX_DELAY", 0)
+    def test_reindex_on_unchanged_head_reuploads_everything(self):
+        """Test that deleting the hash database re-embeds an otherwise up-to-date vault."""
+        vault = self.sync.vault_path
+        (vault / "a.md").write_text("a")
+        (vault / "b.md").write_text("b")
+        repo = MagicMock()
+        repo.head.commit.hexsha = "aaa"
+        repo.git.status.return_value = ""
+        repo.git.ls_files.return_value = "a.md\0b.md\0"
+        user_dir = Path(self.tmp.name) / "testuser"
+
+        with patch.object(self.sync, "_ensure_repo", return_value=repo), \
+                patch.object(self.sync.indexer, "cleanup_hidden_directory_files", return_value=True), \
+                patch.object(self.sync.indexer, "index_file", return_value=True) as mock_index:
+            self.sync.sync()
+            self.sync.sync()
+            self.assertEqual(mock_index.call_count, 2)
+
+            (user_dir / "sync_hashes.json").unlink()
+            (user_dir / "sync_meta.json").unlink()
+            self.sync.sync()
 
-        # Mock git_config.json existence
-        mock_config_path = MagicMock()
-        mock_config_path.exists.return_value = True
+        self.assertEqual(mock_index.call_count, 4)
+        # One work-tree scan per cycle, shared by the up-to-date check, indexing and push
+        self.assertEqual(repo.git.status.call_count, 3)
+        self.assertEqual(set(json.loads((user_dir / "sync_hashes.json").read_text())), {"a.md", "b.md"})
 
-        # Mock constructing path / "git_config.json"
-        # When user_dir / "git_config.json" is called, return mock_config_path
-        mock_user_dir.__truediv__.return_value = mock_config_path
+    def test_reindex_during_cycle_is_not_undone(self):
+        """Test that a reindex issued while files are indexing keeps only that cycle's updates."""
+        vault = self.sync.vault_path
+        (vault / "a.md").write_text("a")
+        (vault / "b.md").write_text("b")
+        repo = MagicMock()
+        repo.head.commit.hexsha = "aaa"
+        repo.git.status.return_value = ""
+        repo.git.ls_files.return_value = "a.md\0b.md\0"
+        user_dir = Path(self.tmp.name) / "testuser"
 
-        # Mock file reading
-        mock_config_path.read_text.return_value = '{"repo_url": "http://test", "token": "abc"}'
-        mock_config_path.with_suffix.return_value = mock_config_path # For atomic write temp file
+        def reindex_then_upload(file_path):
+            for name in ("sync_hashes.json", "sync_meta.json", "indexed_head", "hidden_cleanup_head"):
+                (user_dir / name).unlink(missing_ok=True)
+            return True
 
-        mock_storage_root.exists.return_value = True
-        mock_storage_root.iterdir.return_value = [mock_user_dir]
+        with patch.object(self.sync, "_ensure_repo", return_value=repo), \
+                patch.object(self.sync.indexer, "cleanup_hidden_directory_files", return_value=True), \
+                patch.object(self.sync.indexer, "index_file", return_value=True) as mock_index:
+            self.sync.sync()
+            (vault / "a.md").write_text("changed")
+            repo.git.status.return_value = " M a.md"
+            mock_index.side_effect = reindex_then_upload
+            self.sync.sync()
 
-        manager = SyncManager()
-        manager.process_cycle()
+            self.assertEqual(set(json.loads((user_dir / "sync_hashes.json").read_text())), {"a.md"})
+            self.assertFalse((user_dir / "indexed_head").exists())
+
+            mock_index.reset_mock(side_effect=True)
+            repo.git.status.return_value = ""
+            self.sync.sync()
+
+        mock_index.assert_called_once_with(vault / "b.md")
+
+class TestSyncManager(unittest.TestCase):
+    @patch("main.GitSync")
+    def test_run_discovers_users(self, mock_git_sync):
+        """Test that the manager finds users with valid config."""
+        with tempfile.TemporaryDirectory() as tmp:
+            # Setup directory structure with one configured user
+            user_dir = Path(tmp) / "testuser_1"
+            user_dir.mkdir()
+            (user_dir / "git_config.json").write_text('{"repo_url": "http://test", "token": "abc"}')
+
+            with patch("main.STORAGE_ROOT", Path(tmp)):
+                manager = SyncManager()
+                manager.process_cycle()
 
         # Verify GitSync was instantiated and sync() called
         mock_git_sync.assert_called()
         mock_git_sync.return_value.sync.assert_called_once()
 
+    @patch("main.GitSync")
+    def test_stopped_user_config_is_parsed_once(self, mock_git_sync):
+        """Test that a stopped user is skipped and its unchanged config is not re-read."""
+        with tempfile.TemporaryDirectory() as tmp:
+            user_dir = Path(tmp) / "stopped_user"
+            user_dir.mkdir()
+            (user_dir / "git_config.json").write_text('{"repo_url": "http://test", "stopped": true}')
+
+            with patch("main.STORAGE_ROOT", Path(tmp)):
+                manager = SyncManager()
+                manager.process_cycle()
+                with patch.object(Path, "read_text") as mock_read:
+                    manager.process_cycle()
+
+        mock_read.assert_not_called()
+        mock_git_sync.assert_not_called()
+
+    @patch("main.GitSync")
+    def test_active_user_config_is_not_reparsed_after_status_update(self, mock_git_sync):
+        """Test that the status write refreshes the cache instead of forcing a re-read."""
+        with tempfile.TemporaryDirectory() as tmp:
+            user_dir = Path(tmp) / "active_user"
+            user_dir.mkdir()
+            (user_dir / "git_config.json").write_text('{"repo_url": "http://test", "token": "abc"}')
+
+            with patch("main.STORAGE_ROOT", Path(tmp)):
+                manager = SyncManager()
+                manager.process_cycle()
+                with patch.object(Path, "read_text") as mock_read:
+                    manager.process_cycle()
+
+            self.assertEqual(json.loads((user_dir / "git_config.json").read_text())["failure_count"], 0)
+        mock_read.assert_not_called()
+        self.assertEqual(mock_git_sync.return_value.sync.call_count, 2)
+
+    @patch("main.GitSync")
+    def test_cycle_syncs_every_configured_user(self, mock_git_sync):
+        """Test that all configured users are synced and users without config are skipped."""
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for user_id in ("alice", "bob"):
+                (root / user_id).mkdir()
+                (root / user_id / "git_config.json").write_text('{"repo_url": "http://test", "token": "abc"}')
+            (root / "unconfigured").mkdir()
+
+            with patch("main.STORAGE_ROOT", root):
+                SyncManager().process_cycle()
+
+            synced = sorted(call.args[0] for call in mock_git_sync.call_args_list)
+            self.assertEqual(synced, ["alice", "bob"])
+            self.assertEqual(json.loads((root / "alice" / "git_config.json").read_text())["failure_count"], 0)
+
 if __name__ == '__main__':
     unittest.main()
@@ -14,19 +14,8 @@ def test_worker_directory_exists():
     assert worker_dir.name == "Worker"
 
 
-def test_worker_main_exists():
-    """Test that main.py exists in Worker"""
+@pytest.mark.parametrize("filename", ["main.py", "requirements.txt", "Dockerfile"])
+def test_worker_file_exists(filename):
+    """Test that the Worker's entry point and build files exist"""
     worker_dir = Path(__file__).parent.parent.parent
-    assert (worker_dir / "main.py").exists()
-
-
-def test_worker_requirements_exists():
-    """Test that requirements.txt exists"""
-    worker_dir = Path(__file__).parent.parent.parent
-    assert (worker_dir / "requirements.txt").exists()
-
-
-def test_worker_dockerfile_exists():
-    """Test that Dockerfile exists"""
-    worker_dir = Path(__file__).parent.parent.parent
-    assert (worker_dir / "Dockerfile").exists()
+    assert (worker_dir / filename).exists()